@@ -0,0 +1,100 @@
+"""Сравнение декодирования обновлений: pydantic Update и RawUpdate.
+
+    python -m bench.decoding --updates 2000 --commands 0.1
+"""
+import argparse
+import json
+import random
+from time import perf_counter
+
+from lib.bot import models
+from lib.bot.decoding import decode_updates
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--updates', type=int, default=2000, help='updates in a batch')
+parser.add_argument('--commands', type=float, default=0.1, help='share of commands')
+parser.add_argument('--rounds', type=int, default=20)
+
+
+def _user(i):
+    return {'id': i, 'is_bot': False, 'first_name': f'user{i}', 'username': f'user{i}'}
+
+
+def _chat(i, pinned=None):
+    chat = {'id': -1000 - i, 'type': 'supergroup', 'title': f'chat {i}'}
+    if pinned:
+        chat['pinned_message'] = pinned
+    return chat
+
+
+def _message(i, command=False, depth=2):
+    text = '/meme cats' if command else f'hello world, message number {i} with a link'
+    entities = [{'type': 'url', 'offset': 0, 'length': 5},
+                {'type': 'bold', 'offset': 6, 'length': 5}]
+    if command:
+        entities.insert(0, {'type': 'bot_command', 'offset': 0, 'length': 5})
+
+    message = {
+        'message_id': i,
+        'from': _user(i % 50),
+        'date': 1666000000 + i,
+        'chat': _chat(i % 10),
+        'text': text,
+        'entities': entities,
+    }
+    if depth:
+        message['reply_to_message'] = _message(i - 1, depth=depth - 1)
+        message['sender_chat'] = _chat(i % 10, pinned=_message(i - 2, depth=depth - 1))
+    return message
+
+
+def make_body(count: int, commands: float) -> bytes:
+    updates = [
+        {'update_id': i, 'message': _message(i, command=random.random() < commands)}
+        for i in range(count)
+    ]
+    return json.dumps({'ok': True, 'result': updates}).encode()
+
+
+def baseline(body: bytes) -> int:
+    """Current path: every update is validated."""
+    data = json.loads(body)
+    updates = [models.Update.parse_obj(u) for u in data['result']]
+    return sum(1 for u in updates
+               if any(e.type == models.EEntityType.bot_command for e in u.message.entities))
+
+
+def fast(body: bytes) -> int:
+    """Only updates with commands are validated."""
+    _, updates = decode_updates(body)
+    return sum(1 for u in updates if u.has_command() and u.model)
+
+
+def measure(func, body: bytes, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        func(body)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    args = parser.parse_args()
+    random.seed(1)
+    body = make_body(args.updates, args.commands)
+
+    assert baseline(body) == fast(body)
+
+    base = measure(baseline, body, args.rounds)
+    new = measure(fast, body, args.rounds)
+
+    print(f'updates: {args.updates}, commands: {args.commands:.0%}, body: {len(body) / 1024:.0f} KiB')
+    print(f'pydantic Update: {base * 1e6 / args.updates:8.1f} us/update')
+    print(f'RawUpdate:       {new * 1e6 / args.updates:8.1f} us/update')
+    print(f'speedup:         {base / new:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
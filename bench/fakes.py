@@ -0,0 +1,197 @@
+"""Локальные заглушки Telegram Bot API, pic.re и страниц Pinterest."""
+import asyncio
+import random
+from collections import defaultdict, deque
+from time import monotonic, time
+
+from aiohttp import web
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    command = text.split()[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'bench', 'username': f'user{chat_id}'},
+            'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'bench'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+        },
+    }
+
+
+class FakeTelegram:
+    """Bot API: getUpdates, sendMessage, sendPhoto, getChat, getMe.
+
+    Каждый ответ задерживается на latency секунд, доля throttle_rate
+    отправок получает 429 с retry_after. Задержка команды - время от
+    первой выдачи обновления боту до первой отправки в тот же чат.
+
+    Как и Telegram, getUpdates подтверждает обновления с update_id меньше
+    offset, а остальные выдает снова, пока offset их не пройдет. Повторные
+    выдачи считаются в redelivered.
+    """
+
+    def __init__(self, latency: float = 0., throttle_rate: float = 0., retry_after: int = 1):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+        # Неподтвержденные обновления по возрастанию update_id.
+        self._updates: deque[dict] = deque()
+        self._has_updates = asyncio.Event()
+        # update_id, уже выданные хотя бы раз.
+        self._sent: set[int] = set()
+        # chat_id -> моменты выдачи обновлений, на которые еще нет ответа.
+        self._delivered: dict[int, deque[float]] = defaultdict(deque)
+
+        self.latencies: list[float] = []
+        self.completed_at: list[float] = []
+        self.calls: dict[str, int] = defaultdict(int)
+        self.throttled = 0
+        self.redelivered = 0
+        self._message_id = 0
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self._handle)
+
+    def push(self, update: dict):
+        """Makes the update available to getUpdates."""
+        self._updates.append(update)
+        self._has_updates.set()
+
+    def delivered(self, chat_id: int):
+        """Marks the moment an update of the chat reached the bot."""
+        self._delivered[chat_id].append(monotonic())
+
+    def _complete(self, chat_id: int):
+        pending = self._delivered.get(chat_id)
+        if pending:
+            now = monotonic()
+            self.latencies.append(now - pending.popleft())
+            self.completed_at.append(now)
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        self._message_id += 1
+        return {
+            'message_id': self._message_id,
+            'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            **fields,
+        }
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        data = await request.json() if request.can_read_body else {}
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(data)})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method in ('sendMessage', 'sendPhoto') and random.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            })
+
+        chat_id = data.get('chat_id', 0)
+        if method == 'sendMessage':
+            self._complete(chat_id)
+            result = self._message(chat_id, text=data.get('text', ''))
+        elif method == 'sendPhoto':
+            self._complete(chat_id)
+            file_id = f'file-{self._message_id}'
+            result = self._message(chat_id, photo=[
+                {'file_id': file_id, 'file_unique_id': file_id, 'width': 800, 'height': 600},
+            ])
+        elif method == 'getChat':
+            result = {'id': chat_id, 'type': 'private', 'first_name': 'bench'}
+        elif method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'bench', 'username': 'bench_bot'}
+        else:
+            return web.json_response({'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, data: dict) -> list[dict]:
+        limit = data.get('limit') or 100
+        offset = data.get('offset') or 0
+
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._sent.discard(self._updates.popleft()['update_id'])
+
+        if not self._updates:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), data.get('timeout') or 0)
+            except asyncio.TimeoutError:
+                return []
+
+        batch = [self._updates[i] for i in range(min(limit, len(self._updates)))]
+        for update in batch:
+            if update['update_id'] in self._sent:
+                self.redelivered += 1
+                continue
+            self._sent.add(update['update_id'])
+            self.delivered(update['message']['chat']['id'])
+        return batch
+
+
+class FakeUpstreams:
+    """pic.re (POST /image) и страницы pinshuffle и Pinterest."""
+
+    def __init__(self, latency: float = 0., pins_per_page: int = 25, page_padding: int = 64 * 1024):
+        self.latency = latency
+        self.pins_per_page = pins_per_page
+        # Страницы настоящих сервисов большие, ссылка на картинку - в середине.
+        self.padding = b'<div>' + b'x' * page_padding + b'</div>'
+        self.base_url = ''
+
+        self._images = 0
+        self.calls: dict[str, int] = defaultdict(int)
+
+        self.app = web.Application()
+        self.app.router.add_post('/image', self._image)
+        self.app.router.add_get('/shuffle', self._shuffle)
+        self.app.router.add_get('/pin/{pin}', self._pin)
+
+    async def _delay(self, name: str):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _image(self, request: web.Request) -> web.Response:
+        await self._delay('image')
+        self._images += 1
+        return web.json_response({'file_url': f'https://pic.re/image/{self._images}.jpg'})
+
+    async def _shuffle(self, request: web.Request) -> web.Response:
+        await self._delay('shuffle')
+        pins = ''.join(
+            f'<a pin-url="{self.base_url}/pin/{random.getrandbits(48)}">pin</a>'
+            for _ in range(self.pins_per_page)
+        )
+        return web.Response(body=self.padding + pins.encode() + self.padding, content_type='text/html')
+
+    async def _pin(self, request: web.Request) -> web.Response:
+        await self._delay('pin')
+        image = f'<img src="https://i.pinimg.com/originals/{request.match_info["pin"]}.jpg">'.encode()
+        return web.Response(body=self.padding + image + self.padding, content_type='text/html')
+
+
+async def serve(app: web.Application, host: str = '127.0.0.1') -> tuple[web.AppRunner, str]:
+    """Starts the app on a free port. Returns the runner and the base url."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://{host}:{port}'
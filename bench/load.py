@@ -0,0 +1,273 @@
+"""Нагрузочный бенчмарк SuperBot с локальными заглушками Telegram и апстримов.
+
+Бот запускается отдельным процессом, как в проде, и получает поток команд
+через polling или вебхук. Задержка команды - время от выдачи обновления
+боту до ответа в чат.
+
+    python -m bench.load --mode polling --updates 5000 --rate 500 --output polling.json
+    python -m bench.load --mode webhook --updates 5000 --compare polling.json
+"""
+import argparse
+import asyncio
+import json
+import logging.config
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+from datetime import datetime
+from time import monotonic
+
+import aiohttp
+
+from bench.fakes import FakeTelegram, FakeUpstreams, make_update, serve
+
+
+TOKEN = '123456:bench-token'
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+parser.add_argument('--updates', type=int, default=2000)
+parser.add_argument('--rate', type=float, default=0, help='updates per second, 0 - as fast as possible')
+parser.add_argument('--chats', type=int, default=500)
+parser.add_argument('--commands', default='/anime,/meme,/pwd', help='comma separated commands to send')
+parser.add_argument('--latency', type=float, default=0.02, help='Bot API response latency, seconds')
+parser.add_argument('--upstream-latency', type=float, default=0.05, help='pic.re and Pinterest latency, seconds')
+parser.add_argument('--throttle', type=float, default=0, help='share of sends answered with 429')
+parser.add_argument('--rate-limit', action='store_true', help='keep the send rate limiter enabled')
+parser.add_argument('--connections', type=int, default=40, help='concurrent webhook deliveries')
+parser.add_argument('--workers', type=int, default=8)
+parser.add_argument('--idle-timeout', type=float, default=10, help='stop after seconds without answers')
+parser.add_argument('--capture', help='record the journal of the run for bench.replay')
+parser.add_argument('--output', help='save results to the json file')
+parser.add_argument('--compare', help='results of a previous run to compare with')
+parser.add_argument('--serve', help=argparse.SUPPRESS)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def make_config(args, workdir: str, port: int) -> dict:
+    return {
+        'bot': {
+            'token': TOKEN,
+            'name': 'bench_bot',
+            'polling_mode': args.mode == 'polling',
+            'offset_file': os.path.join(workdir, 'offset'),
+            'dead_letter_file': os.path.join(workdir, 'dead_letters.jsonl'),
+            'workers': args.workers,
+            'poll_timeout': 10,
+            'file_id_cache': {'filename': os.path.join(workdir, 'file_ids.json')},
+            'rate_limit': {'enable': args.rate_limit},
+            'capture': {'enable': bool(args.capture), 'filename': os.path.abspath(args.capture or 'capture.jsonl.gz')},
+        },
+        'modules': ['src.modules.Anime', 'src.modules.Pwd', 'src.modules.Meme'],
+        'web': {'host': '127.0.0.1', 'port': port},
+        'clients': {
+            'pinterest': {'url': '', 'cookie': 'bench'},
+            'http_cache': {'directory': os.path.join(workdir, 'http_cache')},
+        },
+        'logging': {
+            'root': workdir,
+            'filename': 'bot.log',
+            'loggers': ['modules', 'http-client', 'utils', 'uvicorn', 'bot'],
+        },
+    }
+
+
+def run_bot(spec_path: str):
+    """Child process: the bot from main.build with clients pointed at the fakes."""
+    import uvicorn
+
+    import main
+    from lib.config.config import parse_dict_config
+    from src.context import Context
+
+    with open(spec_path) as file:
+        spec = json.load(file)
+
+    config = parse_dict_config(spec['config'])
+    logging.config.dictConfig(config['logging'])
+    superbot = main.build(config)
+
+    telegram = f'{spec["telegram"]}/bot{TOKEN}'
+    superbot.bot.base_url = telegram
+    superbot.longpollbot.base_url = telegram
+    Context().anime.base_url = spec['upstreams']
+    Context().pinterest_shuffle.base_url = f'{spec["upstreams"]}/shuffle'
+
+    uvicorn.run(superbot.app, host='127.0.0.1', port=config['web']['port'], log_config=None)
+
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, process, timeout: float = 60):
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        if process.returncode is not None:
+            raise RuntimeError(f'bot exited with code {process.returncode}')
+        try:
+            async with session.get(f'{url}/health/ready') as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('bot is not ready')
+
+
+async def _drive(args, telegram: FakeTelegram, session: aiohttp.ClientSession, url: str):
+    commands = args.commands.split(',')
+    slots = asyncio.Semaphore(args.connections)
+    deliveries = []
+
+    async def deliver(update: dict):
+        try:
+            telegram.delivered(update['message']['chat']['id'])
+            async with session.post(f'{url}/updates', json=update) as resp:
+                await resp.read()
+        finally:
+            slots.release()
+
+    started = monotonic()
+    for i in range(args.updates):
+        if args.rate:
+            delay = started + i / args.rate - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        update = make_update(i + 1, random.randint(1, args.chats), random.choice(commands))
+        if args.mode == 'polling':
+            telegram.push(update)
+            if not args.rate and i % 100 == 0:
+                await asyncio.sleep(0)
+        else:
+            await slots.acquire()
+            deliveries.append(asyncio.create_task(deliver(update)))
+
+    await asyncio.gather(*deliveries)
+
+
+async def _wait_done(args, telegram: FakeTelegram):
+    last, last_change = 0, monotonic()
+    while len(telegram.latencies) < args.updates:
+        await asyncio.sleep(0.1)
+        if len(telegram.latencies) != last:
+            last, last_change = len(telegram.latencies), monotonic()
+        elif monotonic() - last_change > args.idle_timeout:
+            break
+
+
+async def run(args) -> dict:
+    random.seed(1)
+    telegram = FakeTelegram(latency=args.latency, throttle_rate=args.throttle)
+    upstreams = FakeUpstreams(latency=args.upstream_latency)
+
+    telegram_runner, telegram_url = await serve(telegram.app)
+    upstreams_runner, upstreams.base_url = await serve(upstreams.app)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        spec_path = os.path.join(workdir, 'spec.json')
+        with open(spec_path, 'w') as file:
+            json.dump({
+                'config': make_config(args, workdir, port),
+                'telegram': telegram_url,
+                'upstreams': upstreams.base_url,
+            }, file)
+
+        process = await asyncio.create_subprocess_exec(sys.executable, '-m', 'bench.load', '--serve', spec_path)
+        try:
+            url = f'http://127.0.0.1:{port}'
+            async with aiohttp.ClientSession() as session:
+                await _wait_ready(session, url, process)
+                started = monotonic()
+                await _drive(args, telegram, session, url)
+                await _wait_done(args, telegram)
+        finally:
+            if process.returncode is None:
+                process.terminate()
+            await process.wait()
+            await telegram_runner.cleanup()
+            await upstreams_runner.cleanup()
+
+    latencies = sorted(telegram.latencies)
+    duration = (telegram.completed_at[-1] - started) if telegram.completed_at else 0.
+    return {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'serve', 'capture')},
+        'updates': args.updates,
+        'completed': len(latencies),
+        'duration': round(duration, 3),
+        'throughput': round(len(latencies) / duration, 1) if duration else 0.,
+        'latency': {
+            'p50': round(_percentile(latencies, 0.5), 4),
+            'p95': round(_percentile(latencies, 0.95), 4),
+            'p99': round(_percentile(latencies, 0.99), 4),
+            'max': round(latencies[-1], 4) if latencies else 0.,
+        },
+        # На Linux ru_maxrss в килобайтах. Процесс бота - единственный дочерний.
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'throttled': telegram.throttled,
+        # Обновления, которые getUpdates выдал повторно.
+        'redelivered': telegram.redelivered,
+        'telegram_calls': dict(telegram.calls),
+        'upstream_calls': dict(upstreams.calls),
+    }
+
+
+def _report(result: dict, previous: dict = None):
+    rows = [
+        ('completed', lambda r: r['completed'], ''),
+        ('throughput', lambda r: r['throughput'], ' upd/s'),
+        ('latency p50', lambda r: r['latency']['p50'] * 1000, ' ms'),
+        ('latency p95', lambda r: r['latency']['p95'] * 1000, ' ms'),
+        ('latency p99', lambda r: r['latency']['p99'] * 1000, ' ms'),
+        ('peak rss', lambda r: r['peak_rss_mb'], ' MiB'),
+    ]
+
+    print(f'mode: {result["args"]["mode"]}, updates: {result["updates"]}, duration: {result["duration"]}s')
+    for name, get, unit in rows:
+        line = f'{name:12} {get(result):10.1f}{unit}'
+        if previous is not None:
+            old = get(previous)
+            change = f'{(get(result) - old) / old:+.1%}' if old else 'n/a'
+            line += f'   was {old:10.1f}{unit}  {change}'
+        print(line)
+
+    if result['throttled']:
+        print(f'429 responses: {result["throttled"]}')
+    if result.get('redelivered'):
+        print(f'redelivered updates: {result["redelivered"]}')
+
+
+def main():
+    args = parser.parse_args()
+    if args.serve:
+        run_bot(args.serve)
+        return
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+
+    result = asyncio.run(run(args))
+    _report(result, previous)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Стоимость вызова Logger: прежняя реализация и текущая.
+
+    python -m bench.logger --calls 200000
+"""
+import argparse
+import asyncio
+import logging
+from collections import OrderedDict
+from time import perf_counter
+
+from lib.logger.structlog import Logger
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--calls', type=int, default=200000)
+parser.add_argument('--rounds', type=int, default=5)
+
+
+class LegacyLogger:
+    """Logger до оптимизации: контекст строится до проверки уровня."""
+
+    def __init__(self, logger: logging.Logger, *, _ctx=None, **fields):
+        self._logger = logger
+        self._ctx = _ctx or OrderedDict()
+        self._ctx.update(**fields)
+        self._tasks = []
+        self._loop = asyncio.get_event_loop()
+        self._own_ctx = True
+
+    def with_fields(self, ctx: dict = None, **fields) -> 'LegacyLogger':
+        ctx = _legacy_merge(self._ctx, ctx, fields)
+        return LegacyLogger(self._logger, _ctx=ctx)
+
+    def _json_format(self, ctx=None, **fields) -> dict:
+        fields = _legacy_merge(self._ctx, ctx, fields)
+        fields = _legacy_sort_ctx(fields)
+        return {'ctx': fields}
+
+    def debug(self, msg, ctx=None, **fields):
+        self._logger.debug(msg, stacklevel=2, extra=self._json_format(ctx, **fields))
+
+    def info(self, msg, ctx=None, **fields):
+        self._logger.info(msg, stacklevel=2, extra=self._json_format(ctx, **fields))
+
+
+def _legacy_sort_ctx(data: dict) -> dict:
+    data = data.copy()
+    keys = list(data.keys())
+    if not isinstance(data, OrderedDict):
+        new_dict = OrderedDict()
+        for key in sorted(keys):
+            new_dict[key] = data[key]
+        data = new_dict
+    for key in data:
+        if isinstance(data[key], dict):
+            data[key] = _legacy_sort_ctx(data[key])
+    return data
+
+
+def _legacy_merge(*fields, dest=None):
+    dest = dest if dest is not None else OrderedDict()
+    for group in fields:
+        if group:
+            _legacy_stringify_keys(group)
+            _legacy_float_to_int(group)
+            for key in group.keys():
+                dest[key] = group[key]
+    return dest
+
+
+def _legacy_stringify_keys(data: dict):
+    for key in list(data.keys()):
+        if isinstance(data[key], dict):
+            _legacy_stringify_keys(data[key])
+        if not isinstance(key, str):
+            data[str(key)] = data[key]
+            del data[key]
+
+
+def _legacy_float_to_int(data: dict):
+    for key in data.keys():
+        if isinstance(data[key], dict):
+            _legacy_float_to_int(data[key])
+            continue
+        if isinstance(data[key], float) and data[key] == int(data[key]):
+            data[key] = int(data[key])
+
+
+def _make(cls, stdlib: logging.Logger):
+    # Контекст как у логгера запроса в BaseClient._request.
+    return cls(stdlib).with_fields(update=123456, chat={'id': -1001, 'type': 'supergroup'}) \
+                      .with_fields(method='get', url='https://pic.re/image')
+
+
+def _scenarios(logger):
+    return {
+        'debug, level off': lambda: logger.debug('request', status=200, time=0.25),
+        'info, level on':   lambda: logger.info('request', status=200, time=0.25),
+        'with_fields':      lambda: logger.with_fields(func='refill', cycle=1),
+    }
+
+
+def measure(func, calls: int, rounds: int) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, perf_counter() - start)
+    return best / calls
+
+
+def main():
+    args = parser.parse_args()
+
+    stdlib = logging.getLogger('bench.logger')
+    stdlib.propagate = False
+    # Обработчик ничего не пишет: измеряется только стоимость логгера.
+    stdlib.addHandler(logging.NullHandler())
+    stdlib.setLevel(logging.INFO)
+
+    legacy = _scenarios(_make(LegacyLogger, stdlib))
+    current = _scenarios(_make(Logger, stdlib))
+
+    print(f'{"":20} {"legacy":>10} {"current":>10}')
+    for name in legacy:
+        old = measure(legacy[name], args.calls, args.rounds)
+        new = measure(current[name], args.calls, args.rounds)
+        print(f'{name:20} {old * 1e9:8.0f}ns {new * 1e9:8.0f}ns {old / new:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
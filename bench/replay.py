@@ -0,0 +1,183 @@
+"""Воспроизведение журнала bot.capture без сети.
+
+Обновления из журнала передаются в SuperBot._process_update, запросы
+к апстримам получают записанные ответы. Задержка - время обработки
+одного обновления ботом.
+
+    python -m bench.replay capture.jsonl.gz --config config.yaml --output replay.json
+    python -m bench.replay capture.jsonl.gz --config config.yaml --speed 1 --tracemalloc --compare replay.json
+"""
+import argparse
+import asyncio
+import json
+import logging.config
+import os
+import tempfile
+import tracemalloc
+from copy import deepcopy
+from datetime import datetime
+from time import monotonic
+
+from lib import journal
+from lib.bot.decoding import RawUpdate
+from lib.config.config import parse_config
+from main import build
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('journal', help='journal written with bot.capture')
+parser.add_argument('--config', '-c', default='config.yaml')
+parser.add_argument('--speed', type=float, default=0, help='pace relative to the recorded one, 0 - as fast as possible')
+parser.add_argument('--concurrency', type=int, default=8, help='updates processed at once')
+parser.add_argument('--rate-limit', action='store_true', help='keep the send rate limiter of the config')
+parser.add_argument('--latency', action='store_true', help='delay upstream responses by the recorded time')
+parser.add_argument('--tracemalloc', action='store_true', help='trace allocations, slows the replay down')
+parser.add_argument('--top', type=int, default=15, help='allocation sites to report')
+parser.add_argument('--output', help='save results to the json file')
+parser.add_argument('--compare', help='results of a previous run to compare with')
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def make_config(config: dict, workdir: str, rate_limit: bool = False) -> dict:
+    """Keeps the bot settings, moves files of the bot to workdir."""
+    config = deepcopy(config)
+    bot = config['bot']
+    # Обновления передаются напрямую, polling и вебхук не нужны.
+    bot['polling_mode'] = False
+    bot['capture']['enable'] = False
+    # Лимитер отправки ограничивает пропускную способность сверху, а не код бота.
+    bot['rate_limit']['enable'] = bot['rate_limit']['enable'] and rate_limit
+    bot['offset_file'] = os.path.join(workdir, 'offset')
+    bot['dead_letter_file'] = os.path.join(workdir, 'dead_letters.jsonl')
+    bot['file_id_cache']['filename'] = os.path.join(workdir, 'file_ids.json')
+    config['clients']['http_cache']['directory'] = ''
+    return config
+
+
+async def replay(args, records: list[dict], config: dict) -> dict:
+    updates = [r for r in records if r['type'] == 'update']
+    player = journal.Player(records, latency=args.latency)
+    journal.player = player
+
+    superbot = build(config)
+    await superbot.startup()
+
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def process(record: dict):
+        started = monotonic()
+        try:
+            await superbot._process_update(RawUpdate(record['update']))
+        finally:
+            latencies.append(monotonic() - started)
+            slots.release()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    tasks = []
+    started = monotonic()
+    try:
+        for record in updates:
+            if args.speed:
+                delay = started + (record['time'] - updates[0]['time']) / args.speed - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await slots.acquire()
+            tasks.append(asyncio.create_task(process(record)))
+        await asyncio.gather(*tasks)
+        duration = monotonic() - started
+
+        allocations = None
+        if args.tracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().statistics('lineno')
+            allocations = {
+                'current_mb': round(current / 2 ** 20, 2),
+                'peak_mb': round(peak / 2 ** 20, 2),
+                'top': [
+                    {'where': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                    for stat in stats[:args.top]
+                ],
+            }
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+        await superbot.shutdown()
+        journal.player = None
+
+    latencies.sort()
+    return {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'journal': os.path.abspath(args.journal),
+        'args': {k: v for k, v in vars(args).items() if k not in ('journal', 'output', 'compare')},
+        'updates': len(updates),
+        'duration': round(duration, 3),
+        'throughput': round(len(updates) / duration, 1) if duration else 0.,
+        'latency': {
+            'p50': round(_percentile(latencies, 0.5), 4),
+            'p95': round(_percentile(latencies, 0.95), 4),
+            'p99': round(_percentile(latencies, 0.99), 4),
+            'max': round(latencies[-1], 4) if latencies else 0.,
+        },
+        # Промахи значат, что бот делает запросы, которых не было при записи.
+        'upstream': player.stats(),
+        'allocations': allocations,
+    }
+
+
+def _report(result: dict, previous: dict = None):
+    rows = [
+        ('throughput', lambda r: r['throughput'], ' upd/s'),
+        ('latency p50', lambda r: r['latency']['p50'] * 1000, ' ms'),
+        ('latency p95', lambda r: r['latency']['p95'] * 1000, ' ms'),
+        ('latency p99', lambda r: r['latency']['p99'] * 1000, ' ms'),
+    ]
+    if result['allocations']:
+        rows.append(('alloc peak', lambda r: r['allocations']['peak_mb'] if r['allocations'] else 0., ' MiB'))
+
+    print(f'updates: {result["updates"]}, duration: {result["duration"]}s, '
+          f'upstream hits: {result["upstream"]["hits"]}, misses: {result["upstream"]["misses"]}')
+    for name, get, unit in rows:
+        line = f'{name:12} {get(result):10.1f}{unit}'
+        if previous is not None:
+            old = get(previous)
+            change = f'{(get(result) - old) / old:+.1%}' if old else 'n/a'
+            line += f'   was {old:10.1f}{unit}  {change}'
+        print(line)
+
+    if result['allocations']:
+        print('top allocations:')
+        for stat in result['allocations']['top']:
+            print(f'  {stat["size_kb"]:10.1f} KiB {stat["count"]:8} {stat["where"]}')
+
+
+def main():
+    args = parser.parse_args()
+
+    config = parse_config(args.config)
+    logging.config.dictConfig(config['logging'])
+    records = list(journal.read(args.journal))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = asyncio.run(replay(args, records, make_config(config, workdir, args.rate_limit)))
+    _report(result, previous)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
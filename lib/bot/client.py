@@ -1,33 +1,69 @@
 from lib.client import BaseClient
-from lib.bot import models
+from lib.bot import models, errors
+from lib.bot.scheduler import SendScheduler
+from lib.bot.file_cache import FileIdCache
+from lib.logger import get_logger
 
-from pydantic import Protocol
 
-
-RETRY_CODES = [429, 500, 502, 503, 504]
+_logger = get_logger('bot.client')
 
 
 class BotClient(BaseClient):
     base_url: str = "https://api.telegram.org/bot"
-    
-    def __init__(self, token: str, name: str = None):
+    connector_profile: str = 'telegram'
+    # Ошибки Telegram обрабатывает SendScheduler и поллер.
+    circuit_breaker: bool = False
+
+    def __init__(
+        self,
+        token: str,
+        name: str = None,
+        scheduler: SendScheduler = None,
+        file_cache: FileIdCache = None,
+    ):
         super().__init__()
-        
+
         self.base_url = f'{self.base_url}{token}'
         self.name = name
-        
+        self.scheduler = scheduler
+        self.file_cache = file_cache
+
         self.headers = {
             "content-type": "application/json"
         }
-    
+
+    async def _call(self, method: str, data: dict = None):
+        """Calls Bot API method. Returns result or raises TelegramError."""
+        response = await self.post(method, json=data, raise_for_status=False)
+        response_data = await response.json()
+
+        if not response_data.get('ok'):
+            raise errors.from_response(response_data)
+
+        return response_data['result']
+
+    async def _send(self, chat_id: int, method: str, data: dict):
+        """Calls sending method through the scheduler if it is set."""
+        if self.scheduler is None:
+            return await self._call(method, data)
+
+        return await self.scheduler.send(chat_id, lambda: self._call(method, data))
+
+    async def warmup(self):
+        """Opens a connection to Bot API with getMe."""
+        try:
+            await self.get_me()
+        except Exception as e:
+            # Бот продолжит работу: соединение откроется при первом запросе.
+            _logger.warning('warmup failed', error=e)
+
     async def get_me(self) -> models.User:
         """
             https://core.telegram.org/bots/api#getme
         """
-        response = await self.post('/getMe')
-        response_data = await response.text()
-        models.User.parse_raw(response_data, proto=Protocol.json)
-    
+        result = await self._call('/getMe')
+        return models.User.parse_obj(result)
+
     async def send_message(
         self,
         chat_id: int,
@@ -49,39 +85,49 @@ class BotClient(BaseClient):
             "disable_notification": disable_notification,
             "protect_content": protect_content,
         }
-        
+
         if reply_to_message_id:
             data["reply_to_message_id"] = reply_to_message_id
             data["allow_sending_without_reply"] = True
-            
-        response = await self.post('/sendMessage', json=data)
-        
-        response_data = await response.json()
-        if response_data['ok']:
-            message = models.Message.parse_obj(response_data['result'])
-            return message
-    
+
+        result = await self._send(chat_id, '/sendMessage', data)
+        return models.Message.parse_obj(result)
+
     async def get_chat(self, chat_id: int) -> models.Chat:
         """
-            https://core.telegram.org/bots/api#getme
+            https://core.telegram.org/bots/api#getchat
         """
-        
-        response = await self.post("/getChat", json={"chat_id": chat_id})
-        response_data = await response.json()
-        
-        return models.Chat.parse_obj(response_data['result'])
+        result = await self._call("/getChat", {"chat_id": chat_id})
+        return models.Chat.parse_obj(result)
 
     async def send_photo_by_url(
-        self, 
+        self,
         chat_id: int,
         photo: str,
     ):
-        response = await self.post(
-            "/sendPhoto", 
-            json={"chat_id": chat_id, 'photo': photo}
-        )
-        
-        response_data = await response.json()
-        if response_data['ok']:
-            message = models.Message.parse_obj(response_data['result'])
-            return message
\ No newline at end of file
+        """
+            https://core.telegram.org/bots/api#sendphoto
+        """
+        file_id = self.file_cache.get(photo) if self.file_cache is not None else None
+        if file_id:
+            try:
+                result = await self._send(chat_id, "/sendPhoto", {"chat_id": chat_id, 'photo': file_id})
+                return models.Message.parse_obj(result)
+            except errors.InvalidFileId:
+                # Telegram больше не знает этот file_id: отправляем по url.
+                # Остальные ошибки не связаны с file_id, запись остается.
+                self.file_cache.discard(photo)
+
+        result = await self._send(chat_id, "/sendPhoto", {"chat_id": chat_id, 'photo': photo})
+        message = models.Message.parse_obj(result)
+
+        if self.file_cache is not None and message.photo:
+            # Последний размер - самый большой.
+            self.file_cache.set(photo, message.photo[-1].file_id)
+
+        return message
+
+    async def close(self):
+        if self.file_cache is not None:
+            await self.file_cache.flush()
+        await super().close()
@@ -0,0 +1,110 @@
+"""Быстрое декодирование обновлений.
+
+Обновление остаётся словарём, пока обработчику не понадобится модель.
+Проверка на команду смотрит только на entities сообщения, поэтому
+обычные сообщения в группах отбрасываются без валидации pydantic.
+"""
+import json
+
+from .models import Update
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:  # pragma: no cover
+    loads = json.loads
+
+
+# Глубина вложенных reply_to_message / pinned_message, которая попадает в модель.
+MAX_DEPTH = 2
+
+_update_parts = ['message', 'edited_message', 'channel_post', 'edited_channel_post']
+
+
+def cap_depth(message: dict, depth: int = MAX_DEPTH) -> dict:
+    """Returns a copy of the message without nested messages deeper than depth."""
+    message = dict(message)
+
+    reply = message.get('reply_to_message')
+    if reply is not None:
+        if depth > 0:
+            message['reply_to_message'] = cap_depth(reply, depth - 1)
+        else:
+            del message['reply_to_message']
+
+    for key in ('chat', 'sender_chat', 'forward_from_chat'):
+        chat = message.get(key)
+        if chat is None or 'pinned_message' not in chat:
+            continue
+
+        chat = dict(chat)
+        if depth > 0:
+            chat['pinned_message'] = cap_depth(chat['pinned_message'], depth - 1)
+        else:
+            del chat['pinned_message']
+        message[key] = chat
+
+    return message
+
+
+class RawUpdate:
+    """Обновление в виде словаря с ленивой моделью."""
+
+    __slots__ = ('data', '_model')
+
+    def __init__(self, data: dict):
+        self.data = data
+        self._model: Update = None
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'RawUpdate':
+        return cls(loads(body))
+
+    @property
+    def update_id(self) -> int:
+        return self.data['update_id']
+
+    @property
+    def message(self) -> dict | None:
+        """Returns the first message-like part of the update."""
+        for part in _update_parts:
+            message = self.data.get(part)
+            if message is not None:
+                return message
+        return None
+
+    @property
+    def chat_id(self) -> int | None:
+        message = self.message
+        if message is None:
+            return None
+        return message['chat']['id']
+
+    def has_command(self) -> bool:
+        for part in _update_parts:
+            message = self.data.get(part)
+            if message is None:
+                continue
+
+            for entity in message.get('entities') or ():
+                if entity.get('type') == 'bot_command':
+                    return True
+        return False
+
+    @property
+    def model(self) -> Update:
+        """Returns the validated update. It is built once on first access."""
+        if self._model is None:
+            data = dict(self.data)
+            for part in _update_parts:
+                if data.get(part) is not None:
+                    data[part] = cap_depth(data[part])
+            self._model = Update.parse_obj(data)
+        return self._model
+
+
+def decode_updates(body: bytes) -> tuple[dict, list[RawUpdate]]:
+    """Decodes getUpdates response. Returns response and its updates."""
+    response = loads(body)
+    updates = [RawUpdate(u) for u in response.get('result') or ()]
+    return response, updates
@@ -1,6 +1,27 @@
-
 class TelegramError(Exception):
     code = ''
+    # Может ли повтор запроса завершиться успешно.
+    retriable = False
+
+    def __init__(self, description: str = None, error_code: int = None, parameters: dict = None):
+        super().__init__(description or self.code)
+        self.description = description or self.code
+        self.error_code = error_code
+        self.parameters = parameters or {}
+
+
+class RetryAfter(TelegramError):
+    code = 'Too Many Requests'
+    retriable = True
+
+    @property
+    def retry_after(self) -> float:
+        return float(self.parameters.get('retry_after', 1))
+
+
+class TelegramServerError(TelegramError):
+    code = 'Internal Server Error'
+    retriable = True
 
 
 class MessageNotModified(TelegramError):
@@ -11,6 +32,15 @@ class PhotoBadDimensions(TelegramError):
     code = 'PHOTO_INVALID_DIMENSIONS'
 
 
+class InvalidFileId(TelegramError):
+    # wrong file identifier/HTTP URL specified, wrong remote file identifier specified
+    code = 'file identifier'
+
+
+class FileReferenceExpired(InvalidFileId):
+    code = 'FILE_REFERENCE_EXPIRED'
+
+
 class ExportLinkPermissionDenied(TelegramError):
     code = 'not enough rights to export chat invite link'
 
@@ -32,4 +62,37 @@ class BotWasKicked(TelegramError):
 
 
 class BotWasBlocked(TelegramError):
-    code = 'bot was blocked'
\ No newline at end of file
+    code = 'bot was blocked'
+
+
+_by_description: list[type[TelegramError]] = [
+    MessageNotModified,
+    PhotoBadDimensions,
+    InvalidFileId,
+    FileReferenceExpired,
+    ExportLinkPermissionDenied,
+    UserNotFound,
+    ChatNotFound,
+    ChatWasUpgraded,
+    BotWasKicked,
+    BotWasBlocked,
+]
+
+
+def from_response(data: dict) -> TelegramError:
+    """Returns an error for the failed Bot API response."""
+    description = data.get('description') or ''
+    error_code = data.get('error_code')
+    parameters = data.get('parameters') or {}
+
+    if error_code == 429 or 'retry_after' in parameters:
+        return RetryAfter(description, error_code, parameters)
+
+    if error_code and error_code >= 500:
+        return TelegramServerError(description, error_code, parameters)
+
+    for error_class in _by_description:
+        if error_class.code in description:
+            return error_class(description, error_code, parameters)
+
+    return TelegramError(description, error_code, parameters)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+from lib.files import write_atomic
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.file-cache')
+
+
+class FileIdCache:
+    """LRU кэш url -> file_id для файлов, уже загруженных в Telegram.
+
+    Повторная отправка по file_id не требует ни скачивания файла из
+    источника, ни загрузки его Telegram'ом. Кэш сохраняется на диск
+    через flush(), если задан filename.
+    """
+
+    def __init__(self, filename: str = None, maxsize: int = 10000):
+        self.filename = filename
+        self.maxsize = maxsize
+
+        self._data: OrderedDict[str, str] = OrderedDict()
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def load(self):
+        if not self.filename or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            _logger.warning('cannot load file_id cache', error=e)
+            return
+
+        for url, file_id in data:
+            self._data[url] = file_id
+        self._evict()
+
+    def get(self, url: str) -> str | None:
+        file_id = self._data.get(url)
+        if file_id is None:
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(url)
+        self.hits += 1
+        return file_id
+
+    def set(self, url: str, file_id: str):
+        if self._data.get(url) == file_id:
+            return
+
+        self._data[url] = file_id
+        self._data.move_to_end(url)
+        self._evict()
+        self._dirty = True
+
+    def discard(self, url: str):
+        """Forgets the file_id rejected by Telegram."""
+        if self._data.pop(url, None) is not None:
+            self.stale += 1
+            self._dirty = True
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+        }
+
+    async def flush(self, ctx=None):
+        if not self.filename or not self._dirty:
+            return
+
+        self._dirty = False
+        # Порядок сохраняется, чтобы после загрузки LRU остался тем же.
+        data = json.dumps(list(self._data.items()), ensure_ascii=False).encode()
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, write_atomic, self.filename, data)
+        except Exception:
+            self._dirty = True
+            raise
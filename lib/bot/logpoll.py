@@ -1,5 +1,6 @@
 from lib.client import BaseClient
-from .models import Update
+from .decoding import RawUpdate, decode_updates
+from .errors import TelegramError
 import aiohttp
 
 
@@ -9,6 +10,9 @@ READ_TIMEOUT = 60.
 
 class LongPollBot(BaseClient):
     base_url: str = "https://api.telegram.org/bot"
+    connector_profile: str = 'telegram'
+    # Long poll отвечает медленно намеренно, ошибки обрабатывает поллер.
+    circuit_breaker: bool = False
     
     def __init__(self, token: str, name: str = None):
         super().__init__()
@@ -21,24 +25,27 @@ class LongPollBot(BaseClient):
         }
     
     def _create_session(self, **kwargs) -> aiohttp.ClientSession:
-        if not self._session:
-            self._session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(
-                    sock_connect=CONN_TIMEOUT,
-                    sock_read=READ_TIMEOUT))
-        return self._session
+        # Общий таймаут не задаётся: запрос висит до READ_TIMEOUT.
+        kwargs['timeout'] = aiohttp.ClientTimeout(
+            sock_connect=CONN_TIMEOUT,
+            sock_read=READ_TIMEOUT)
+        return super()._create_session(**kwargs)
     
-    async def get_updates(self, offset: int, timeout=None) -> list[Update]:
-        timeout = timeout or READ_TIMEOUT
+    async def get_updates(self, offset: int, timeout=None, limit: int = None) -> list[RawUpdate]:
+        """
+            https://core.telegram.org/bots/api#getupdates
+        """
+        if timeout is None:
+            timeout = READ_TIMEOUT
         
         params = {'offset': offset, 'timeout': timeout}
+        if limit:
+            params['limit'] = limit
+        
         response = await self.post('/getUpdates', json=params)
-        data = await response.json()
+        data, updates = decode_updates(await response.read())
         
         if not data['ok']:
-            return []
+            raise TelegramError(data.get('description'))
         
-        updates = [
-            Update.parse_obj(u) for u in data['result']
-        ]
-        return updates
\ No newline at end of file
+        return updates
@@ -37,9 +37,9 @@ class Chat(BaseModel, extra=Extra.ignore):
   
   
 class EEntityType(str, Enum):
-    mention = 'mentrion'
+    mention = 'mention'
     hashtag = 'hashtag'
-    cashtag = 'cachtag'
+    cashtag = 'cashtag'
     bot_command = 'bot_command'
     url = 'url'
     email = 'email'
@@ -66,6 +66,14 @@ class MessageEntity(BaseModel):
     custom_emoji_id: str | None = None
     
 
+class PhotoSize(BaseModel, extra=Extra.ignore):
+    file_id: str
+    file_unique_id: str
+    width: int
+    height: int
+    file_size: int | None = None
+
+
 class Message(BaseModel, extra=Extra.ignore):
     message_id: int
     from_: User | None = Field(title='from', alias='from', default=None)
@@ -80,6 +88,7 @@ class Message(BaseModel, extra=Extra.ignore):
     edit_date: int | None = None
     text: str | None = None
     entities: list[MessageEntity] | None = Field(default_factory=list)
+    photo: list[PhotoSize] | None = None
 
 
 class Update(BaseModel, extra=Extra.ignore):
@@ -88,3 +97,8 @@ class Update(BaseModel, extra=Extra.ignore):
     edited_message: Message | None
     channel_post: Message | None
     edited_channel_post: Message | None
+
+
+# Chat и Message ссылаются друг на друга.
+Chat.update_forward_refs()
+Message.update_forward_refs()
@@ -0,0 +1,232 @@
+import asyncio
+from collections import deque
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from lib.bot.errors import RetryAfter, TelegramError
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.scheduler')
+
+RETRY_CODES = [429, 500, 502, 503, 504]
+
+# Число чатов с лимитами, после которого удаляются восстановившиеся.
+SWEEP_THRESHOLD = 1024
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity за раз."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._blocked_until = 0.
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Returns seconds to wait until a token is available."""
+        now = monotonic()
+        self._refill(now)
+
+        wait = max(0., self._blocked_until - now)
+        if self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self._tokens -= 1
+
+    def pause(self, seconds: float):
+        """Blocks the bucket, e.g. after 429 response."""
+        self._blocked_until = max(self._blocked_until, monotonic() + seconds)
+        self._tokens = 0
+
+    @property
+    def idle(self) -> bool:
+        """True if the bucket is full and not paused, i.e. equal to a new one."""
+        now = monotonic()
+        self._refill(now)
+        return self._tokens >= self.capacity and self._blocked_until <= now
+
+
+class _ChatLimits:
+    def __init__(self, bucket: TokenBucket, group: TokenBucket | None):
+        self.bucket = bucket
+        self.group = group
+
+    @property
+    def idle(self) -> bool:
+        return self.bucket.idle and (self.group is None or self.group.idle)
+
+
+class _ChatQueue:
+    def __init__(self, limits: _ChatLimits):
+        self.limits = limits
+        self.items: deque = deque()
+        self.task: asyncio.Task = None
+
+
+class SendScheduler:
+    """Планировщик исходящих сообщений с учётом лимитов Telegram.
+
+    Сообщения одного чата отправляются строго по очереди. Перед отправкой
+    берутся токены из общего bucket, bucket чата и, для групп, bucket группы.
+    На 429 чат ставится на паузу на retry_after секунд, после чего отправка
+    повторяется.
+
+    https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+    """
+
+    def __init__(
+        self,
+        global_per_second: float = 30,
+        chat_per_second: float = 1,
+        chat_burst: int = 3,
+        group_per_minute: float = 20,
+        max_attempts: int = 5,
+    ):
+        self.chat_per_second = chat_per_second
+        self.chat_burst = chat_burst
+        self.group_per_minute = group_per_minute
+        self.max_attempts = max_attempts
+
+        self._global = TokenBucket(global_per_second, global_per_second)
+        self._chats: dict[int, _ChatQueue] = {}
+        # Лимиты живут дольше очереди: отправки из обработчика идут по одной,
+        # и очередь чата пустеет между ними. Восстановившиеся лимиты равны
+        # новым, поэтому удаляются, когда их становится много.
+        self._limits: dict[int, _ChatLimits] = {}
+        self._sweep_at = SWEEP_THRESHOLD
+
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.wait_total = 0.
+        self.wait_max = 0.
+
+    @property
+    def depth(self) -> int:
+        """Returns the number of messages waiting to be sent."""
+        return sum(len(q.items) for q in self._chats.values())
+
+    def stats(self) -> dict:
+        done = self.sent + self.failed
+        return {
+            'depth': self.depth,
+            'chats': len(self._chats),
+            'limited_chats': len(self._limits),
+            'sent': self.sent,
+            'failed': self.failed,
+            'throttled': self.throttled,
+            'wait_avg': round(self.wait_total / done, 3) if done else 0.,
+            'wait_max': round(self.wait_max, 3),
+        }
+
+    def _chat_limits(self, chat_id: int) -> _ChatLimits:
+        limits = self._limits.get(chat_id)
+        if limits is None:
+            if len(self._limits) >= self._sweep_at:
+                self._sweep()
+            group = None
+            if chat_id < 0:
+                group = TokenBucket(self.group_per_minute / 60, self.group_per_minute)
+            limits = _ChatLimits(TokenBucket(self.chat_per_second, self.chat_burst), group)
+            self._limits[chat_id] = limits
+        return limits
+
+    def _sweep(self):
+        for chat_id, limits in list(self._limits.items()):
+            if chat_id not in self._chats and limits.idle:
+                del self._limits[chat_id]
+        self._sweep_at = max(SWEEP_THRESHOLD, 2 * len(self._limits))
+
+    def _queue(self, chat_id: int) -> _ChatQueue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = _ChatQueue(self._chat_limits(chat_id))
+            self._chats[chat_id] = queue
+        return queue
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable]) -> Any:
+        """Enqueues the call and waits until it is delivered."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        queue = self._queue(chat_id)
+        queue.items.append((call, future, monotonic()))
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._drain(chat_id, queue))
+
+        return await future
+
+    async def _acquire(self, queue: _ChatQueue):
+        buckets = [queue.limits.bucket, queue.limits.group, self._global]
+        buckets = [b for b in buckets if b is not None]
+
+        while True:
+            wait = max(b.delay() for b in buckets)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+
+        for bucket in buckets:
+            bucket.take()
+
+    async def _drain(self, chat_id: int, queue: _ChatQueue):
+        try:
+            while queue.items:
+                call, future, queued = queue.items[0]
+                if not future.cancelled():
+                    await self._deliver(chat_id, queue, call, future, queued)
+                queue.items.popleft()
+        finally:
+            queue.task = None
+            if not queue.items:
+                self._chats.pop(chat_id, None)
+
+    async def _deliver(self, chat_id, queue: _ChatQueue, call, future, queued):
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._acquire(queue)
+
+            wait = monotonic() - queued
+            try:
+                result = await call()
+            except RetryAfter as e:
+                self.throttled += 1
+                _logger.warning('throttled', chat=chat_id, retry_after=e.retry_after)
+                queue.limits.bucket.pause(e.retry_after)
+                if attempt < self.max_attempts:
+                    continue
+                error = e
+            except TelegramError as e:
+                if e.error_code in RETRY_CODES and attempt < self.max_attempts:
+                    await asyncio.sleep(attempt)
+                    continue
+                error = e
+            except Exception as e:
+                error = e
+            else:
+                self._observe(wait)
+                self.sent += 1
+                if not future.done():
+                    future.set_result(result)
+                return
+
+            self._observe(wait)
+            self.failed += 1
+            if not future.done():
+                future.set_exception(error)
+            return
+
+    def _observe(self, wait: float):
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
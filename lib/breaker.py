@@ -0,0 +1,184 @@
+from collections import deque
+from enum import Enum
+from time import monotonic
+from typing import NamedTuple
+
+from lib.logger import get_logger
+
+
+_logger = get_logger('circuit-breaker')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f'circuit for {host} is open, retry in {retry_in:.1f}s')
+        self.host = host
+        self.retry_in = retry_in
+
+
+class State(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class BreakerSettings(NamedTuple):
+    # Сколько последних вызовов учитывается.
+    window: int = 20
+    min_calls: int = 5
+    error_rate: float = 0.5
+    # Вызов дольше slow_call_seconds считается медленным.
+    slow_call_seconds: float = 10.
+    slow_rate: float = 0.8
+    open_seconds: float = 30.
+    half_open_calls: int = 2
+
+
+class CircuitBreaker:
+    """Circuit breaker of one upstream host.
+
+    closed: вызовы проходят, результаты копятся в окне. Когда доля ошибок
+    или медленных вызовов превышает порог, breaker открывается.
+    open: вызовы сразу падают с CircuitOpenError в течение open_seconds.
+    half_open: пропускается half_open_calls пробных вызовов. Если все они
+    успешны, breaker закрывается, при первой ошибке - снова открывается.
+
+    before_call() возвращает номер состояния, в котором вызов допущен, и его
+    нужно передать в on_success, on_failure или on_cancel. Результаты
+    вызовов, допущенных до последней смены состояния, не учитываются:
+    например, успех вызова, начатого до открытия, не считается пробным.
+    """
+
+    def __init__(self, host: str, settings: BreakerSettings = BreakerSettings()):
+        self.host = host
+        self.settings = settings
+
+        self.state = State.CLOSED
+        # Растет при каждой смене состояния.
+        self._generation = 0
+        self._opened_at = 0.
+        # (ошибка, медленный) по последним вызовам.
+        self._window: deque[tuple[bool, bool]] = deque(maxlen=settings.window)
+        self._trials = 0
+        self._trial_successes = 0
+
+        self.rejected = 0
+        self.transitions = 0
+
+    def before_call(self) -> int:
+        """Raises CircuitOpenError if the call must not be made.
+
+        Returns the ticket of the call for on_success, on_failure and on_cancel.
+        """
+        if self.state == State.OPEN:
+            retry_in = self._opened_at + self.settings.open_seconds - monotonic()
+            if retry_in > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.host, retry_in)
+            self._switch(State.HALF_OPEN)
+
+        if self.state == State.HALF_OPEN:
+            if self._trials >= self.settings.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.host, 0.)
+            self._trials += 1
+
+        return self._generation
+
+    def on_success(self, elapsed: float, ticket: int):
+        if ticket != self._generation:
+            # Вызов допущен до смены состояния.
+            return
+
+        slow = elapsed >= self.settings.slow_call_seconds
+
+        if self.state == State.HALF_OPEN:
+            if slow:
+                self._switch(State.OPEN)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.settings.half_open_calls:
+                self._switch(State.CLOSED)
+            return
+
+        self._record(False, slow)
+
+    def on_failure(self, ticket: int):
+        if ticket != self._generation:
+            return
+
+        if self.state == State.HALF_OPEN:
+            self._switch(State.OPEN)
+            return
+
+        self._record(True, False)
+
+    def on_cancel(self, ticket: int):
+        """Frees the trial slot of a call that was cancelled."""
+        if ticket == self._generation and self.state == State.HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def _record(self, failed: bool, slow: bool):
+        self._window.append((failed, slow))
+        calls = len(self._window)
+        if calls < self.settings.min_calls:
+            return
+
+        errors = sum(f for f, _ in self._window)
+        slow_calls = sum(s for _, s in self._window)
+        if errors / calls >= self.settings.error_rate or slow_calls / calls >= self.settings.slow_rate:
+            self._switch(State.OPEN, errors=errors, slow=slow_calls, calls=calls)
+
+    def _switch(self, state: State, **fields):
+        _logger.warning('circuit state changed', host=self.host,
+                        old_state=self.state.value, state=state.value, **fields)
+
+        self.state = state
+        self._generation += 1
+        self.transitions += 1
+        self._trials = 0
+        self._trial_successes = 0
+
+        if state == State.OPEN:
+            self._opened_at = monotonic()
+        elif state == State.CLOSED:
+            self._window.clear()
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state.value,
+            'calls': len(self._window),
+            'errors': sum(f for f, _ in self._window),
+            'rejected': self.rejected,
+            'transitions': self.transitions,
+        }
+
+
+_settings = BreakerSettings()
+_enabled = True
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def configure(config: dict | None):
+    """Updates settings from config section clients.circuit_breaker."""
+    global _settings, _enabled
+    config = dict(config or {})
+    _enabled = config.pop('enable', True)
+    _settings = _settings._replace(**config)
+
+
+def get_breaker(host: str) -> CircuitBreaker | None:
+    """Returns the process-wide breaker of the host, None if breakers are disabled."""
+    if not _enabled:
+        return None
+
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host, _settings)
+    return breaker
+
+
+def stats() -> dict[str, dict]:
+    return {host: breaker.stats() for host, breaker in _breakers.items()}
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Hashable
+
+
+_missing = object()
+
+
+class TTLCache:
+    """LRU кэш с ограничением времени жизни записей.
+
+    Старые записи вытесняются, когда размер превышает maxsize. Запись,
+    прожившая дольше ttl секунд, считается отсутствующей.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600.):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key, _missing)
+        if item is _missing:
+            self.misses += 1
+            return default
+
+        expires, value = item
+        if expires < monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+
+        self._data[key] = (monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default=None):
+        item = self._data.pop(key, _missing)
+        if item is _missing:
+            return default
+        return item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] >= monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
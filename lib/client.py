@@ -1,16 +1,30 @@
 import asyncio
 import json
 import ssl
+import time
+from contextlib import asynccontextmanager
 from enum import Enum
-from typing import Coroutine
+from typing import AsyncIterator
 
 import aiohttp
+from yarl import URL
+from lib import breaker, connectors, http_cache, journal, metrics
+from lib.breaker import CircuitOpenError
+from lib.singleflight import SingleFlight
 from lib.logger import get_logger, loglevel_gt_debug
 
 _logger = get_logger('http-client')
 
 _ssl_context = None
 
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_requests_total = metrics.counter(
+    'http_client_requests_total', 'Upstream HTTP requests.', ('client', 'host', 'method', 'status'))
+_request_duration = metrics.histogram(
+    'http_client_request_duration_seconds', 'Upstream HTTP request latency.', ('client', 'host', 'method'),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.))
+
 
 def load_ca_certificate(cert_filename):
     """Load CA certificate from the file."""
@@ -35,6 +49,27 @@ class Params(dict):
         super().__setitem__(key, value)
 
 
+_IDEMPOTENT_METHODS = frozenset(['get', 'head', 'options'])
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), str(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_freeze, value))
+    return value
+
+
+def _request_key(method: str, url: str, kwargs: dict) -> tuple:
+    return (
+        method.lower(),
+        url,
+        _freeze(kwargs.get('params')),
+        _freeze(kwargs.get('headers')),
+        kwargs.get('allow_redirects'),
+    )
+
+
 class HttpAuth(Enum):
     NONE = 0
     BASIC_AUTH = 1
@@ -56,6 +91,17 @@ class BaseClient:
     max_retries: int = 1
     wait_before_next_retry_seconds: tuple[float, ...] | float = 1.0
     
+    connector_profile: str = 'default'
+    # Одновременные одинаковые GET запросы выполняются один раз.
+    coalesce_requests: bool = False
+    
+    # Вызовы хоста, который не отвечает, сразу падают с CircuitOpenError.
+    circuit_breaker: bool = True
+    
+    response_cache: http_cache.ResponseCache = None
+    # Время жизни ответов без Cache-Control. None - такие ответы не кэшируются.
+    cache_ttl: float = None
+    
     
     def __init__(self, *, 
                  base_url: str = None,
@@ -67,8 +113,13 @@ class BaseClient:
                  raise_for_status: bool = None, 
                  basic_auth_username: str = None,
                  basic_auth_password: str = None,
+                 coalesce_requests: bool = None,
+                 circuit_breaker: bool = None,
+                 response_cache: http_cache.ResponseCache = None,
+                 cache_ttl: float = None,
                  ):
         self._session: aiohttp.ClientSession = None
+        self._flight = SingleFlight()
         
         self.base_url = base_url or self.__class__.base_url
         self.total_timeout = total_timeout or self.__class__.total_timeout
@@ -76,7 +127,11 @@ class BaseClient:
         self.read_sock_timeout = read_sock_timeout or self.__class__.read_sock_timeout
         self.connect_sock_timeout = connect_sock_timeout or self.__class__.connect_sock_timeout
         self.headers = headers or self.__class__.headers or dict()
-        self.raise_for_status = raise_for_status or self.__class__.raise_for_status
+        self.raise_for_status = self.__class__.raise_for_status if raise_for_status is None else raise_for_status
+        self.coalesce_requests = self.__class__.coalesce_requests if coalesce_requests is None else coalesce_requests
+        self.circuit_breaker = self.__class__.circuit_breaker if circuit_breaker is None else circuit_breaker
+        self.response_cache = response_cache or self.__class__.response_cache
+        self.cache_ttl = self.__class__.cache_ttl if cache_ttl is None else cache_ttl
 
         self.basic_auth_username: str = basic_auth_username or self.__class__.basic_auth_username
         self.basic_auth_password: str = basic_auth_password or self.__class__.basic_auth_password
@@ -106,22 +161,97 @@ class BaseClient:
         headers.update(kwargs.get('headers', {}))
         kwargs['headers'] = headers
         
+        if self.response_cache is not None and method.lower() == 'get':
+            return await self._cached_request(method, url, **kwargs)
+        
+        return await self._coalesced_request(method, url, **kwargs)
+    
+    async def _cached_request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        cache = self.response_cache
+        key, entry = await self._cache_lookup(method, url, kwargs)
+        if entry is not None and entry.fresh:
+            cache.record_hit(entry)
+            return entry.response()
+        
+        response = await self._coalesced_request(method, url, **kwargs)
+        
+        if response.status == 304 and entry is not None:
+            return await self._cache_revalidated(key, entry, response)
+        
+        cache.misses += 1
+        if self._cache_ttl(response) is not None:
+            await self._cache_store(key, response, await response.read())
+        
+        return response
+    
+    async def _cache_lookup(self, method: str, url: str, kwargs: dict) -> tuple[tuple, http_cache.CacheEntry | None]:
+        """Returns the cache key and the entry. Adds validators of a stale entry to the request headers."""
+        # Кэш общий для клиентов, поэтому ключ строится по полному адресу.
+        key = _request_key(method, f'{self.base_url or ""}{url}', kwargs)
+        
+        entry = await self.response_cache.get(key)
+        if entry is not None and not entry.fresh:
+            # Запись устарела: просим сервер подтвердить, что она не изменилась.
+            if entry.etag:
+                kwargs['headers']['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                kwargs['headers']['If-Modified-Since'] = entry.last_modified
+        return key, entry
+    
+    async def _cache_revalidated(self, key: tuple, entry: http_cache.CacheEntry, response) -> http_cache.CachedResponse:
+        ttl = http_cache.freshness(response.headers, self.cache_ttl) or 0.
+        entry = entry._replace(expires=time.time() + ttl)
+        await self.response_cache.set(key, entry)
+        self.response_cache.record_hit(entry, revalidated=True)
+        return entry.response()
+    
+    def _cache_ttl(self, response) -> float | None:
+        """Returns the ttl to store the response with, None if it is not cacheable."""
+        if response.status != 200:
+            return None
+        ttl = http_cache.freshness(response.headers, self.cache_ttl)
+        if ttl is not None and (ttl > 0 or 'ETag' in response.headers):
+            return ttl
+        return None
+    
+    async def _cache_store(self, key: tuple, response, body: bytes):
+        await self.response_cache.set(key, http_cache.make_entry(response, body, self._cache_ttl(response)))
+    
+    async def _coalesced_request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        if self.coalesce_requests and method.lower() in _IDEMPOTENT_METHODS:
+            # Тело ответа уже прочитано, поэтому один ответ можно отдать всем.
+            key = _request_key(method, url, kwargs)
+            return await self._flight.do(
+                key, lambda: self._request_with_retries(method, url, **kwargs))
+        
+        return await self._request_with_retries(method, url, **kwargs)
+    
+    @property
+    def coalesced(self) -> int:
+        """Returns number of requests saved by coalescing."""
+        return self._flight.saved
+    
+    async def _request_with_retries(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        _raise_for_status = kwargs.pop('raise_for_status', self.raise_for_status)
+        
         retry_count = 0
         last_exc = None
         while retry_count <= self.max_retries:
             status = 0
             try:
-                _raise_for_status = kwargs.pop('raise_for_status', self.raise_for_status)
-                response = await self._request(method, url, **kwargs)
+                response = await self._guarded_request(method, url, **kwargs)
                 status = response.status
                 
                 if _raise_for_status:
                     response.raise_for_status()
                 
                 return response
+            except CircuitOpenError:
+                raise
             except Exception as e:
                 last_exc = e
-                if status % 100 == 4:
+                # Ошибки клиента не исправятся повтором.
+                if status // 100 == 4:
                     raise e
                 
                 if isinstance(self.wait_before_next_retry_seconds, tuple):
@@ -137,11 +267,193 @@ class BaseClient:
         if last_exc is not None:
             raise last_exc
 
+    def _get_breaker(self, url: str) -> breaker.CircuitBreaker | None:
+        if not self.circuit_breaker:
+            return None
+        
+        if self.base_url:
+            url = f'{self.base_url}{url}'
+        return breaker.get_breaker(URL(url).host)
+    
+    async def _guarded_request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        circuit = self._get_breaker(url)
+        if circuit is None:
+            return await self._request(method, url, **kwargs)
+        
+        ticket = circuit.before_call()
+        started = time.monotonic()
+        try:
+            response = await self._request(method, url, **kwargs)
+        except asyncio.CancelledError:
+            circuit.on_cancel(ticket)
+            raise
+        except Exception:
+            circuit.on_failure(ticket)
+            raise
+        
+        if response.status >= 500:
+            circuit.on_failure(ticket)
+        else:
+            circuit.on_success(time.monotonic() - started, ticket)
+        return response
+    
     async def _request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
         skip_log = loglevel_gt_debug()
         if not skip_log:
             logger = _logger.with_fields(method=method, url=url, params=str(kwargs.get('params')))
         
+        session = self._get_session()
+        
+        if self.base_url:
+            url = f'{self.base_url}{url}'
+
+        status = 'error'
+        started = time.monotonic()
+        try:
+            if journal.player is not None:
+                response = await journal.player.respond(method, url, kwargs)
+                status = response.status
+                return response
+            
+            async with session.request(method, url, **kwargs) as response:
+                # Read response body to use after closed connection.
+                read_bytes = await response.read()
+                status = response.status
+                
+                if not skip_log:
+                    logger.debug('request', status=response.status, time=time.monotonic() - started)
+                
+                if journal.recorder is not None:
+                    journal.recorder.record_exchange(self.__class__.__name__, method, url, kwargs, status,
+                                                     response.headers, read_bytes, time.monotonic() - started)
+                
+                async def read():
+                    return read_bytes
+                
+                # hack
+                response.read = read
+                return response
+        finally:
+            self._observe(method, url, status, time.monotonic() - started)
+    
+    def _observe(self, method: str, url: str, status, elapsed: float):
+        client, host, method = self.__class__.__name__, URL(url).host, method.upper()
+        _requests_total.labels(client, host, method, str(status)).inc()
+        _request_duration.labels(client, host, method).observe(elapsed)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Opens the request without reading the body.
+
+        The body can be read by chunks with iter_chunks(). Leaving the context
+        before the body is read closes the connection, so the rest of the
+        body is never downloaded. Requests are not retried. While a journal
+        is recorded or replayed, and for GET requests answered from the
+        response cache or stored in it, the whole body is read before
+        returning.
+        """
+        headers = self.headers.copy()
+        headers.update(kwargs.get('headers', {}))
+        kwargs['headers'] = headers
+        _raise_for_status = kwargs.pop('raise_for_status', self.raise_for_status)
+        
+        if journal.player is not None or journal.recorder is not None:
+            # Запись и воспроизведение работают с телом целиком.
+            response = await self._guarded_request(method, url, **kwargs)
+            if _raise_for_status:
+                response.raise_for_status()
+            yield journal.RecordedResponse.buffered(response, await response.read())
+            return
+        
+        if self.response_cache is not None and method.lower() == 'get':
+            async with self._cached_stream(method, url, _raise_for_status, **kwargs) as response:
+                yield response
+            return
+        
+        async with self._stream(method, url, _raise_for_status, **kwargs) as response:
+            yield response
+    
+    @asynccontextmanager
+    async def _cached_stream(self, method: str, url: str, raise_for_status: bool,
+                             **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        cache = self.response_cache
+        key, entry = await self._cache_lookup(method, url, kwargs)
+        if entry is not None and entry.fresh:
+            cache.record_hit(entry)
+            yield journal.RecordedResponse.buffered(entry.response(), entry.body)
+            return
+        
+        async with self._stream(method, url, raise_for_status, **kwargs) as response:
+            if response.status == 304 and entry is not None:
+                cached = await self._cache_revalidated(key, entry, response)
+                yield journal.RecordedResponse.buffered(cached, entry.body)
+                return
+            
+            cache.misses += 1
+            if self._cache_ttl(response) is None:
+                # Ответ не кэшируется: тело по-прежнему читается по частям.
+                yield response
+                return
+            
+            body = await response.read()
+            await self._cache_store(key, response, body)
+            yield journal.RecordedResponse.buffered(response, body)
+    
+    @asynccontextmanager
+    async def _stream(self, method: str, url: str, raise_for_status: bool,
+                      **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        circuit = self._get_breaker(url)
+        session = self._get_session()
+        if self.base_url:
+            url = f'{self.base_url}{url}'
+        
+        ticket = None
+        if circuit is not None:
+            ticket = circuit.before_call()
+        started = time.monotonic()
+        observed = False
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                # Длительность - до заголовков, тело читает вызывающий код.
+                self._observe(method, url, response.status, time.monotonic() - started)
+                observed = True
+                if circuit is not None:
+                    if response.status >= 500:
+                        circuit.on_failure(ticket)
+                    else:
+                        circuit.on_success(time.monotonic() - started, ticket)
+                    # Дальнейшие ошибки - при чтении тела, не при вызове.
+                    circuit = None
+                
+                if not loglevel_gt_debug():
+                    _logger.debug('stream', method=method, url=url, status=response.status)
+                
+                if raise_for_status:
+                    response.raise_for_status()
+                
+                try:
+                    yield response
+                finally:
+                    if not response.content.at_eof():
+                        # Тело прочитано не полностью: соединение не переиспользовать.
+                        response.close()
+        except asyncio.CancelledError:
+            if circuit is not None:
+                circuit.on_cancel(ticket)
+            raise
+        except Exception:
+            if not observed:
+                self._observe(method, url, 'error', time.monotonic() - started)
+            if circuit is not None:
+                circuit.on_failure(ticket)
+            raise
+
+    @staticmethod
+    async def iter_chunks(response: aiohttp.ClientResponse, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            yield chunk
+
+    def _get_session(self) -> aiohttp.ClientSession:
         if not self._session:
             self._session = self._create_session(
                 timeout=aiohttp.ClientTimeout(
@@ -151,31 +463,17 @@ class BaseClient:
                     sock_connect=self.connect_sock_timeout,  
                 ),
             )
-        
-        if self.base_url:
-            url = f'{self.base_url}{url}'
-
-        async with self._session.request(method, url, **kwargs) as response:
-            # Read response body to use after closed connection.
-            read_bytes = await response.read()
-            
-            if not skip_log:
-                logger.debug('request', status=response.status)
-            
-            async def read():
-                return read_bytes
-            
-            # hack
-            response.read = read
-            return response
+        return self._session
 
     def _create_session(self, **kwargs) -> aiohttp.ClientSession:
         """Return a new client session. Override in subclasses to customize
         session."""
         global _ssl_context
-        if _ssl_context:
-            kwargs.setdefault('connector',
-                              aiohttp.TCPConnector(ssl_context=_ssl_context))
+        if 'connector' not in kwargs:
+            # Пул соединений общий для всех клиентов профиля.
+            kwargs['connector'] = connectors.get_connector(self.connector_profile, _ssl_context)
+            kwargs['connector_owner'] = False
+            kwargs.setdefault('trace_configs', [connectors.trace_config(self.connector_profile)])
 
         kwargs.setdefault('json_serialize', json.dumps)
         
@@ -184,8 +482,21 @@ class BaseClient:
         
         return aiohttp.ClientSession(**kwargs)
     
-    async def close(self) -> Coroutine:
+    async def warmup(self, url: str = '', method: str = 'head'):
+        """Opens a connection to the upstream in advance."""
+        if journal.player is not None:
+            # Ответы воспроизводятся из журнала, соединения не нужны.
+            return
+        
+        try:
+            response = await self._request(method, url)
+            response.release()
+        except Exception as e:
+            _logger.warning('warmup failed', url=url, error=e)
+
+    async def close(self):
         if self._session:
-            return self._session.close()
+            await self._session.close()
+            self._session = None
     
     
\ No newline at end of file
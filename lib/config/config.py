@@ -95,6 +95,10 @@ def _standartize_logging(section: dict, development=False):
             'backupCount': handler_cfg['backup_count'],
             'maxBytes': handler_cfg['max_bytes'],
         }
+    
+    if section.get('background', True):
+        for name, handler in result['handlers'].items():
+            result['handlers'][name] = _to_background(handler, section)
 
     default_handlers = ['stdout'] if development else ['file']
     # default_level = 'DEBUG' if development else 'INFO'
@@ -119,6 +123,26 @@ def _standartize_logging(section: dict, development=False):
     return result
         
 
+def _to_background(handler: dict, section: dict) -> dict:
+    """Replaces a stream or rotating file handler with BackgroundHandler."""
+    result = {
+        'class': 'lib.logger.handlers.BackgroundHandler',
+        'formatter': handler['formatter'],
+        'queue_size': section.get('queue_size', 10000),
+        'batch_size': section.get('batch_size', 256),
+    }
+    
+    if 'filename' in handler:
+        result['filename'] = handler['filename']
+        result['encoding'] = handler.get('encoding', 'utf-8')
+        result['max_bytes'] = handler.get('maxBytes', 0)
+        result['backup_count'] = handler.get('backupCount', 0)
+    else:
+        result['stream'] = handler['stream']
+    
+    return result
+        
+
 _default_logging = {
     'version': 1,
     'formatters': {
@@ -45,7 +45,83 @@ _SCHEMA: dict = {
             'token': {'type': 'string', 'default': os.getenv('BOT_TOKEN')},
             'name': {'type': 'string', 'default': ''},
             'polling_mode': {'type': 'boolean', 'default': False},
-            'offset_file': {'type': 'string', 'default': ''}
+            'offset_file': {'type': 'string', 'default': ''},
+            'offset_flush_interval': {'type': 'number', 'default': 1.0, 'min': 0},
+            'offset_flush_updates': {'type': 'integer', 'default': 100, 'min': 1},
+            'workers': {'type': 'integer', 'default': 8, 'min': 1},
+            'poll_limit': {'type': 'integer', 'default': 100, 'min': 1, 'max': 100},
+            'poll_timeout': {'type': 'integer', 'default': 50, 'min': 0},
+            'retries': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'attempts': {'type': 'integer', 'default': 5, 'min': 1},
+                    'backoff_base': {'type': 'number', 'default': 0.5, 'min': 0},
+                    'backoff_max': {'type': 'number', 'default': 30, 'min': 0},
+                    'budget_ratio': {'type': 'number', 'default': 0.2, 'min': 0},
+                    'budget_per_second': {'type': 'number', 'default': 1, 'min': 0},
+                }
+            },
+            'dead_letter_file': {'type': 'string', 'default': ''},
+            'loop_monitor': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': True},
+                    'interval': {'type': 'number', 'default': 0.1, 'min': 0.001},
+                    'window': {'type': 'integer', 'default': 600, 'min': 1},
+                    # 0 отключает поиск медленных колбэков.
+                    'slow_callback': {'type': 'number', 'default': 0.25, 'min': 0},
+                    'unhealthy_lag': {'type': 'number', 'default': 1, 'min': 0},
+                    'unhealthy_for': {'type': 'number', 'default': 10, 'min': 0},
+                }
+            },
+            'webhook': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'queue_size': {'type': 'integer', 'default': 1000, 'min': 1},
+                    'workers': {'type': 'integer', 'default': 2, 'min': 1},
+                    'overload_policy': {
+                        'type': 'string',
+                        'default': 'block',
+                        'allowed': ['block', 'shed', 'reject'],
+                    },
+                }
+            },
+            'file_id_cache': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': True},
+                    'filename': {'type': 'string', 'default': ''},
+                    'size': {'type': 'integer', 'default': 10000, 'min': 1},
+                    'flush_interval': {'type': 'number', 'default': 60},
+                }
+            },
+            'rate_limit': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': True},
+                    'global_per_second': {'type': 'number', 'default': 30},
+                    'chat_per_second': {'type': 'number', 'default': 1},
+                    'chat_burst': {'type': 'integer', 'default': 3},
+                    'group_per_minute': {'type': 'number', 'default': 20},
+                    'max_attempts': {'type': 'integer', 'default': 5},
+                }
+            },
+            'max_pending_updates': {'type': 'integer', 'default': 1000, 'min': 1},
+            # Журнал обновлений и запросов к апстримам для bench.replay.
+            'capture': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': False},
+                    'filename': {'type': 'string', 'default': 'capture.jsonl.gz'},
+                    'queue_size': {'type': 'integer', 'default': 10000, 'min': 1},
+                }
+            },
         }
     },
     'web': {
@@ -61,11 +137,55 @@ _SCHEMA: dict = {
     'clients': {
         'type': 'dict',
         'schema': {
+            'connectors': {
+                'type': 'dict',
+                'default': {},
+                'keysrules': {'type': 'string'},
+                'valuesrules': {
+                    'type': 'dict',
+                    'schema': {
+                        'limit': {'type': 'integer', 'min': 0},
+                        'limit_per_host': {'type': 'integer', 'min': 0},
+                        'keepalive_timeout': {'type': 'number', 'min': 0},
+                        'ttl_dns_cache': {'type': 'integer', 'min': 0},
+                    }
+                }
+            },
+            'circuit_breaker': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': True},
+                    'window': {'type': 'integer', 'default': 20, 'min': 1},
+                    'min_calls': {'type': 'integer', 'default': 5, 'min': 1},
+                    'error_rate': {'type': 'number', 'default': 0.5, 'min': 0, 'max': 1},
+                    'slow_call_seconds': {'type': 'number', 'default': 10, 'min': 0},
+                    'slow_rate': {'type': 'number', 'default': 0.8, 'min': 0, 'max': 1},
+                    'open_seconds': {'type': 'number', 'default': 30, 'min': 0},
+                    'half_open_calls': {'type': 'integer', 'default': 2, 'min': 1},
+                }
+            },
+            'http_cache': {
+                'type': 'dict',
+                'default': {},
+                'schema': {
+                    'enable': {'type': 'boolean', 'default': True},
+                    'max_bytes': {'type': 'integer', 'default': 16 * 1024 * 1024, 'min': 0},
+                    'directory': {'type': 'string', 'default': ''},
+                    'disk_max_bytes': {'type': 'integer', 'default': 256 * 1024 * 1024, 'min': 0},
+                }
+            },
             'pinterest': {
                 'type': 'dict',
                 'schema': {
                     'url': {'type': 'string'},
                     'cookie': {'type': 'string'},
+                    'browser_pages': {'type': 'integer', 'default': 2, 'min': 1},
+                    'browser_idle_timeout': {'type': 'number', 'default': 300},
+                    'search_cache_size': {'type': 'integer', 'default': 256},
+                    'search_cache_ttl': {'type': 'number', 'default': 600},
+                    'pin_cache_size': {'type': 'integer', 'default': 4096},
+                    'pin_cache_ttl': {'type': 'number', 'default': 86400},
                 }
             }
         }
@@ -100,6 +220,10 @@ _SCHEMA: dict = {
                 'default': ''
             },
             'filename': {'type': 'string', 'default': ''},
+            # Запись логов из фонового потока пачками.
+            'background': {'type': 'boolean', 'default': True},
+            'queue_size': {'type': 'integer', 'default': 10000, 'min': 1},
+            'batch_size': {'type': 'integer', 'default': 256, 'min': 1},
             'handlers': {
                 'type': 'list',
                 'schema': {
@@ -0,0 +1,111 @@
+import ssl
+from typing import NamedTuple
+
+import aiohttp
+
+
+class ConnectorProfile(NamedTuple):
+    limit: int = 100
+    limit_per_host: int = 0
+    keepalive_timeout: float = 15.
+    ttl_dns_cache: int = 10
+
+
+class ConnectorStats:
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+        self.queued = 0
+        # Запросы, которые ждут заголовков ответа.
+        self.in_flight = 0
+
+
+_profiles: dict[str, ConnectorProfile] = {
+    'default': ConnectorProfile(),
+    'telegram': ConnectorProfile(limit=100, limit_per_host=100, keepalive_timeout=60., ttl_dns_cache=300),
+}
+
+_connectors: dict[str, aiohttp.TCPConnector] = {}
+_stats: dict[str, ConnectorStats] = {}
+
+
+def configure(profiles: dict[str, dict] | None):
+    """Updates profiles from config section clients.connectors."""
+    for name, values in (profiles or {}).items():
+        base = _profiles.get(name, _profiles['default'])
+        _profiles[name] = base._replace(**values)
+
+
+def get_profile(name: str) -> ConnectorProfile:
+    return _profiles.get(name) or _profiles['default']
+
+
+def get_connector(name: str = 'default', ssl_context: ssl.SSLContext = None) -> aiohttp.TCPConnector:
+    """Returns the process-wide connector of the profile.
+
+    Все клиенты одного профиля делят пул соединений, поэтому, например,
+    BotClient и LongPollBot используют одни и те же TLS соединения
+    к api.telegram.org.
+    """
+    connector = _connectors.get(name)
+    if connector is None or connector.closed:
+        profile = get_profile(name)
+        connector = aiohttp.TCPConnector(
+            limit=profile.limit,
+            limit_per_host=profile.limit_per_host,
+            keepalive_timeout=profile.keepalive_timeout,
+            ttl_dns_cache=profile.ttl_dns_cache,
+            ssl=ssl_context,
+        )
+        _connectors[name] = connector
+    return connector
+
+
+def trace_config(name: str = 'default') -> aiohttp.TraceConfig:
+    """Returns trace config counting new and reused connections and requests in flight."""
+    stats = _stats.setdefault(name, ConnectorStats())
+
+    async def on_create(session, ctx, params):
+        stats.created += 1
+
+    async def on_reuse(session, ctx, params):
+        stats.reused += 1
+
+    async def on_queued(session, ctx, params):
+        stats.queued += 1
+
+    async def on_request_start(session, ctx, params):
+        stats.in_flight += 1
+
+    async def on_request_done(session, ctx, params):
+        stats.in_flight -= 1
+
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_end.append(on_create)
+    config.on_connection_reuseconn.append(on_reuse)
+    config.on_connection_queued_start.append(on_queued)
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_done)
+    config.on_request_exception.append(on_request_done)
+    return config
+
+
+def stats() -> dict[str, dict]:
+    result = {}
+    for name in _connectors:
+        profile = get_profile(name)
+        counters = _stats.get(name) or ConnectorStats()
+        result[name] = {
+            'limit': profile.limit,
+            'in_flight': counters.in_flight,
+            'created': counters.created,
+            'reused': counters.reused,
+            'queued': counters.queued,
+        }
+    return result
+
+
+async def close_all():
+    for connector in _connectors.values():
+        await connector.close()
+    _connectors.clear()
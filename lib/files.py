@@ -0,0 +1,28 @@
+import os
+
+
+def write_atomic(filename: str, data: bytes, fsync: bool = True):
+    """Replaces the file content atomically.
+
+    Data is written to a temporary file next to the target, which is then
+    renamed over it. A reader sees either the old or the new content, never a
+    torn file. Blocking: run it in an executor from coroutines.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    tmp = f'{filename}.tmp'
+
+    with open(tmp, 'wb') as file:
+        file.write(data)
+        file.flush()
+        if fsync:
+            os.fsync(file.fileno())
+
+    os.replace(tmp, filename)
+
+    if fsync:
+        # Переименование тоже нужно сбросить на диск.
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, NamedTuple
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from lib.files import write_atomic
+from lib.logger import get_logger
+
+
+_logger = get_logger('http-cache')
+
+
+def parse_cache_control(value: str | None) -> dict[str, str | None]:
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def freshness(headers, default_ttl: float | None) -> float | None:
+    """Returns seconds the response stays fresh, None if it must not be stored."""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in directives or 'private' in directives:
+        return None
+
+    if 'no-cache' in directives:
+        return 0.
+
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name):
+            try:
+                return max(0., float(directives[name]))
+            except ValueError:
+                pass
+
+    return default_ttl
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    status: int
+    headers: tuple[tuple[str, str], ...]
+    body: bytes
+    expires: float
+    etag: str | None
+    last_modified: str | None
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires > time.time()
+
+    def response(self) -> 'CachedResponse':
+        return CachedResponse(self)
+
+
+class CachedResponse:
+    """Ответ из кэша с тем же интерфейсом чтения, что у ClientResponse."""
+
+    from_cache = True
+    # В кэш попадают только ответы на GET.
+    method = 'GET'
+
+    def __init__(self, entry: CacheEntry):
+        self.status = entry.status
+        self.reason = 'OK'
+        self.url = URL(entry.url)
+        self.headers = CIMultiDictProxy(CIMultiDict(entry.headers))
+        self._body = entry.body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = 'utf-8', errors: str = 'strict') -> str:
+        return self._body.decode(encoding, errors)
+
+    async def json(self, *, loads=json.loads, **kwargs):
+        return loads(self._body)
+
+    def raise_for_status(self):
+        return
+
+    def release(self):
+        return
+
+
+class ResponseCache:
+    """Кэш HTTP ответов с LRU вытеснением по размеру тел.
+
+    Записи, вытесненные из памяти, сохраняются на диск, если задан
+    directory. Свежесть определяется Cache-Control, устаревшие записи
+    с ETag или Last-Modified перепроверяются условным запросом.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, directory: str = None, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._memory_bytes = 0
+        # Имя файла -> размер, в порядке записи.
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            filename = os.path.join(self.directory, name)
+            if name.endswith('.tmp') or not os.path.isfile(filename):
+                continue
+            stat = os.stat(filename)
+            files.append((stat.st_mtime, filename, stat.st_size))
+
+        for _, filename, size in sorted(files):
+            self._disk[filename] = size
+            self._disk_bytes += size
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._memory),
+            'bytes': self._memory_bytes,
+            'disk_entries': len(self._disk),
+            'disk_bytes': self._disk_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    def record_hit(self, entry: CacheEntry, revalidated: bool = False):
+        self.hits += 1
+        self.bytes_saved += len(entry.body)
+        if revalidated:
+            self.revalidated += 1
+
+    def _filename(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    async def get(self, key: Hashable) -> CacheEntry | None:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+
+        if self.directory and self._filename(key) in self._disk:
+            loop = asyncio.get_running_loop()
+            filename = self._filename(key)
+            entry = await loop.run_in_executor(None, _read_entry, filename)
+            if entry is None:
+                self._disk_bytes -= self._disk.pop(filename, 0)
+                return None
+            # Вытесненные из памяти записи уходят на диск, как в set().
+            for evicted_key, evicted_entry in self._store_memory(key, entry):
+                if evicted_key != key:
+                    await self._store_disk(evicted_key, evicted_entry)
+            return entry
+
+        return None
+
+    async def set(self, key: Hashable, entry: CacheEntry):
+        evicted = self._store_memory(key, entry)
+
+        if self.directory:
+            for evicted_key, evicted_entry in evicted:
+                await self._store_disk(evicted_key, evicted_entry)
+
+    def _store_memory(self, key: Hashable, entry: CacheEntry) -> list[tuple[Hashable, CacheEntry]]:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.body)
+
+        evicted = []
+        if len(entry.body) > self.max_bytes:
+            return [(key, entry)]
+
+        self._memory[key] = entry
+        self._memory_bytes += len(entry.body)
+
+        while self._memory_bytes > self.max_bytes:
+            evicted_key, evicted_entry = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted_entry.body)
+            evicted.append((evicted_key, evicted_entry))
+
+        return evicted
+
+    async def _store_disk(self, key: Hashable, entry: CacheEntry):
+        if len(entry.body) > self.disk_max_bytes:
+            return
+
+        filename = self._filename(key)
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(None, _write_entry, filename, entry)
+        except OSError as e:
+            _logger.warning('cannot write cache entry', error=e)
+            return
+
+        self._disk_bytes -= self._disk.pop(filename, 0)
+        self._disk[filename] = size
+        self._disk_bytes += size
+
+        while self._disk_bytes > self.disk_max_bytes:
+            old_filename, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            await loop.run_in_executor(None, _remove, old_filename)
+
+
+def _write_entry(filename: str, entry: CacheEntry) -> int:
+    meta = entry._asdict()
+    meta.pop('body')
+    data = json.dumps(meta).encode() + b'\n' + entry.body
+    write_atomic(filename, data, fsync=False)
+    return len(data)
+
+
+def _read_entry(filename: str) -> CacheEntry | None:
+    try:
+        with open(filename, 'rb') as file:
+            header = file.readline()
+            body = file.read()
+    except OSError:
+        return None
+
+    try:
+        meta = json.loads(header)
+        meta['headers'] = tuple(map(tuple, meta['headers']))
+        return CacheEntry(body=body, **meta)
+    except (ValueError, TypeError, KeyError) as e:
+        # Файл прошлой версии или чужой: считается промахом.
+        _logger.warning('cannot read cache entry', filename=filename, error=e)
+        _remove(filename)
+        return None
+
+
+def _remove(filename: str):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+def make_entry(response: aiohttp.ClientResponse, body: bytes, ttl: float) -> CacheEntry:
+    return CacheEntry(
+        url=str(response.url),
+        status=response.status,
+        headers=tuple(response.headers.items()),
+        body=body,
+        expires=time.time() + ttl,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified'),
+    )
@@ -0,0 +1,355 @@
+"""Запись входящих обновлений и обменов с апстримами для воспроизведения.
+
+Журнал - gzip JSONL, одна запись на строку:
+
+    {"type": "update", "time": ..., "update": {...}}
+    {"type": "http", "time": ..., "client": ..., "method": ..., "url": ...,
+     "request": {...}, "status": ..., "headers": [...], "body": ..., "elapsed": ...}
+
+Токены в адресах и куки в заголовках заменяются на REDACTED до записи.
+При воспроизведении Player отвечает на запросы BaseClient записанными
+ответами, сеть не используется.
+"""
+import asyncio
+import base64
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterator
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from lib.logger import get_logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+_logger = get_logger('journal')
+
+REDACTED = 'REDACTED'
+
+_SECRET_HEADERS = frozenset(['cookie', 'set-cookie', 'authorization', 'proxy-authorization', 'x-api-key'])
+_SECRET_PARAMS = frozenset(['token', 'access_token', 'api_key', 'apikey', 'key', 'secret'])
+# Токен Bot API - часть пути: /bot<token>/<method> и /file/bot<token>/<path>.
+_BOT_TOKEN = re.compile(r'^(/file)?/bot\d+:[\w-]+')
+
+_STOP = object()
+
+# Включенные запись и воспроизведение. Проверяются на каждом запросе
+# BaseClient, поэтому это атрибуты модуля.
+recorder: 'Journal' = None
+player: 'Player' = None
+
+
+def redact_url(url: str) -> str:
+    url = URL(url)
+    path = _BOT_TOKEN.sub(rf'\1/bot{REDACTED}', url.raw_path, count=1)
+    query = [(k, REDACTED if k.lower() in _SECRET_PARAMS else v) for k, v in url.query.items()]
+    return str(url.with_path(path, encoded=True).with_query(query))
+
+
+def redact_headers(headers) -> list[tuple[str, str]]:
+    if not headers:
+        return []
+    return [(k, REDACTED if k.lower() in _SECRET_HEADERS else v) for k, v in headers.items()]
+
+
+def _redact_params(params):
+    if not isinstance(params, dict):
+        return params
+    return {k: REDACTED if str(k).lower() in _SECRET_PARAMS else v for k, v in params.items()}
+
+
+def _request_fields(kwargs: dict) -> dict:
+    request = {}
+    for name in ('params', 'json', 'data'):
+        value = kwargs.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        elif name != 'json' and not isinstance(value, (dict, str)):
+            # Формы и потоки не сериализуются.
+            value = repr(value)
+        request[name] = _redact_params(value)
+    return request
+
+
+def _body_fields(body: bytes) -> dict:
+    try:
+        return {'body': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_b64': base64.b64encode(body).decode()}
+
+
+def _dumps(record: dict) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(record, default=str, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson не пишет целые больше 64 бит, json справляется.
+            pass
+    return json.dumps(record, ensure_ascii=False, default=str).encode()
+
+
+class Journal:
+    """Дописывает записи в gzip JSONL из фонового потока.
+
+    Запись в event loop только кладет словарь в ограниченную очередь,
+    сериализация и сжатие идут в потоке. При заполненной очереди записи
+    отбрасываются и учитываются в dropped.
+    """
+
+    def __init__(self, filename: str, queue_size: int = 10000, batch_size: int = 256):
+        self.filename = os.path.abspath(filename)
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.written = 0
+
+        self._thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_update(self, update: dict):
+        self.write({'type': 'update', 'time': time.time(), 'update': update})
+
+    def record_exchange(self, client: str, method: str, url: str, kwargs: dict,
+                        status: int, headers, body: bytes, elapsed: float):
+        self.write({
+            'type': 'http',
+            'time': time.time(),
+            'client': client,
+            'method': method.lower(),
+            'url': redact_url(url),
+            'request': {'headers': redact_headers(kwargs.get('headers')), **_request_fields(kwargs)},
+            'status': status,
+            'headers': redact_headers(headers),
+            **_body_fields(body),
+            'elapsed': round(elapsed, 6),
+        })
+
+    def close(self):
+        """Writes out queued records and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            'filename': self.filename,
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def _run(self):
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Каждый запуск дописывает новый gzip member, gzip.open читает их подряд.
+        with gzip.open(self.filename, 'ab') as stream:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                lines = []
+                for record in batch:
+                    if record is _STOP:
+                        continue
+                    try:
+                        lines.append(_dumps(record))
+                    except Exception as e:
+                        # Одна несериализуемая запись не теряет остальные.
+                        self.dropped += 1
+                        _logger.error('cannot serialize journal record', error=e)
+                try:
+                    if lines:
+                        stream.write(b'\n'.join(lines) + b'\n')
+                        # Журнал читается и после аварийного завершения.
+                        stream.flush()
+                        self.written += len(lines)
+                except Exception as e:
+                    _logger.error('cannot write journal', error=e)
+
+                if any(record is _STOP for record in batch):
+                    return
+
+
+def start_recording(filename: str, queue_size: int = 10000) -> Journal:
+    global recorder
+    if recorder is None:
+        recorder = Journal(filename, queue_size=queue_size)
+        _logger.info('recording started', filename=recorder.filename)
+    return recorder
+
+
+def stop_recording():
+    global recorder
+    journal, recorder = recorder, None
+    if journal is not None:
+        journal.close()
+        _logger.info('recording stopped', **journal.stats())
+
+
+def read(filename: str) -> Iterator[dict]:
+    """Yields journal records. A truncated tail of a crashed run is skipped."""
+    loads = orjson.loads if orjson is not None else json.loads
+    with gzip.open(filename, 'rb') as stream:
+        try:
+            for line in stream:
+                if line.strip():
+                    yield loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+
+class _RecordedContent:
+    """Тело записанного ответа с интерфейсом чтения StreamReader."""
+
+    def __init__(self, body: bytes):
+        self._body = body
+        self._pos = 0
+
+    def at_eof(self) -> bool:
+        return self._pos >= len(self._body)
+
+    async def iter_chunked(self, size: int):
+        while not self.at_eof():
+            chunk = self._body[self._pos:self._pos + size]
+            self._pos += len(chunk)
+            yield chunk
+
+    async def read(self, n: int = -1) -> bytes:
+        end = len(self._body) if n < 0 else self._pos + n
+        chunk = self._body[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+
+class RecordedResponse:
+    """Ответ с прочитанным телом и тем же интерфейсом чтения, что у ClientResponse."""
+
+    from_cache = False
+
+    def __init__(self, method: str, status: int, url: str, headers, body: bytes):
+        self.method = method.upper()
+        self.status = status
+        self.reason = 'OK' if status < 400 else 'Error'
+        self.url = URL(url)
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.content = _RecordedContent(body)
+
+    @classmethod
+    def from_record(cls, record: dict) -> 'RecordedResponse':
+        if 'body_b64' in record:
+            body = base64.b64decode(record['body_b64'])
+        else:
+            body = record['body'].encode()
+        return cls(record['method'], record['status'], record['url'], record['headers'], body)
+
+    @classmethod
+    def buffered(cls, response: aiohttp.ClientResponse, body: bytes) -> 'RecordedResponse':
+        """Returns the response with the body readable by chunks again."""
+        return cls(response.method, response.status, str(response.url), response.headers, body)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = 'utf-8', errors: str = 'strict') -> str:
+        return self._body.decode(encoding, errors)
+
+    async def json(self, *, loads=json.loads, **kwargs):
+        return loads(self._body)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(
+                None, (), status=self.status, message=self.reason, headers=self.headers)
+
+    def release(self):
+        return
+
+    def close(self):
+        return
+
+
+def _fingerprint(method: str, url: str, request: dict) -> tuple:
+    body = {k: v for k, v in request.items() if k != 'headers'}
+    return method.lower(), url, _dumps(body) if body else b''
+
+
+class Player:
+    """Отвечает на запросы записанными ответами.
+
+    Ответ ищется сначала по методу, адресу и телу запроса, затем только
+    по методу и адресу, затем по методу и пути без хоста: так журнал,
+    записанный на стенде, воспроизводится с боевыми адресами. Ответы на
+    один ключ отдаются по кругу в порядке записи. На запрос, которого нет
+    в журнале, поднимается ошибка соединения, как при недоступном апстриме.
+    """
+
+    def __init__(self, records: list[dict], latency: bool = False):
+        # С latency ответ задерживается на записанное время запроса.
+        self.latency = latency
+
+        self._exact: dict[tuple, deque[dict]] = {}
+        self._by_url: dict[tuple, deque[dict]] = {}
+        self._by_path: dict[tuple, deque[dict]] = {}
+        for record in records:
+            if record.get('type') != 'http':
+                continue
+            key = _fingerprint(record['method'], record['url'], record.get('request') or {})
+            self._exact.setdefault(key, deque()).append(record)
+            self._by_url.setdefault(key[:2], deque()).append(record)
+            self._by_path.setdefault((key[0], URL(key[1]).raw_path_qs), deque()).append(record)
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _take(records: deque[dict]) -> dict:
+        record = records[0]
+        records.rotate(-1)
+        return record
+
+    async def respond(self, method: str, url: str, kwargs: dict) -> RecordedResponse:
+        url = redact_url(url)
+        key = _fingerprint(method, url, _request_fields(kwargs))
+
+        records = (self._exact.get(key) or self._by_url.get(key[:2])
+                   or self._by_path.get((key[0], URL(url).raw_path_qs)))
+        if not records:
+            self.misses += 1
+            raise aiohttp.ClientConnectionError(f'no recorded response for {method.upper()} {url}')
+
+        self.hits += 1
+        record = self._take(records)
+        if self.latency and record.get('elapsed'):
+            await asyncio.sleep(record['elapsed'])
+        return RecordedResponse.from_record(record)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -4,6 +4,11 @@ import os
 import time
 from typing import OrderedDict
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 USE_JSON_HANDLER = bool(os.getenv('LOG_JSON_HANDLER', 0))
 NODE = os.uname()
 
@@ -92,6 +97,14 @@ class JsonFormatter(logging.Formatter):
     converter = time.gmtime
     nodename = NODE
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Поля, одинаковые для всех записей процесса.
+        self._static = {'hostname': JsonFormatter.nodename.nodename, 'pid': os.getpid()}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        return self._json_format(record)
+    
     def _json_format(self, record: logging.LogRecord) -> str:
         ctx = getattr(record, 'ctx', '')
         result = {
@@ -100,7 +113,24 @@ class JsonFormatter(logging.Formatter):
             'logger': record.name,
             'text': record.getMessage(),
             'ctx': ctx,
-            'hostname': JsonFormatter.nodename
         }
+        result.update(self._static)
         
-        return json.dumps(result, ensure_ascii=False, default=_default_encoder)
\ No newline at end of file
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            result['exc'] = record.exc_text
+        if record.stack_info:
+            result['stack'] = self.formatStack(record.stack_info)
+        
+        return _dumps(result)
+
+
+def _dumps(data: dict) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_default_encoder, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            # orjson не пишет целые больше 64 бит, json справляется.
+            pass
+    return json.dumps(data, ensure_ascii=False, default=_default_encoder)
@@ -0,0 +1,174 @@
+import copy
+import logging
+import os
+import queue
+import sys
+import threading
+import weakref
+
+
+_handlers = weakref.WeakSet()
+
+# Сигнал фоновому потоку завершиться.
+_STOP = object()
+
+
+class BackgroundHandler(logging.Handler):
+    """Пишет записи в файл или поток из фонового потока.
+
+    emit() только подставляет аргументы в сообщение, как QueueHandler,
+    и кладет запись в ограниченную очередь, поэтому форматирование,
+    запись на диск и ротация не блокируют event loop.
+    Поток забирает записи пачками до batch_size и пишет их одним вызовом
+    write(). Если очередь заполнена, запись отбрасывается и учитывается
+    в dropped.
+
+    Без filename записи пишутся в stream (по умолчанию sys.stdout). Файл
+    ротируется как в RotatingFileHandler, если заданы max_bytes
+    и backup_count.
+    """
+
+    def __init__(self, filename: str = None, stream=None, encoding: str = 'utf-8',
+                 max_bytes: int = 0, backup_count: int = 0,
+                 queue_size: int = 10000, batch_size: int = 256):
+        super().__init__()
+        self.filename = os.path.abspath(filename) if filename else None
+        self.encoding = encoding
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+
+        self._stream = stream
+        self._queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.written = 0
+
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        _handlers.add(self)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Returns a copy of the record that does not depend on the caller's objects.
+
+        Arguments are merged into the message and the traceback is rendered
+        now: by the time the thread formats the record they may change.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                formatter = self.formatter or logging.Formatter()
+                record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Waits until all queued records are written."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            # Ждем место в очереди: после закрытия записи уже не теряются.
+            self._queue.put(_STOP)
+            self._thread.join()
+        super().close()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def _run(self):
+        stream = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            records = []
+            lines = []
+            for record in batch:
+                if record is _STOP:
+                    stop = True
+                    continue
+                records.append(record)
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+
+            try:
+                if lines:
+                    stream = self._write(stream, '\n'.join(lines) + '\n')
+                    self.written += len(lines)
+            except Exception:
+                self.handleError(records[0])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop:
+                if stream is not None and self.filename:
+                    stream.close()
+                return
+
+    def _write(self, stream, data: str):
+        if stream is None:
+            stream = self._open()
+
+        if self.filename:
+            # Файл открыт в бинарном режиме: max_bytes - размер в байтах.
+            data = data.encode(self.encoding, 'backslashreplace')
+            rotate = self.max_bytes > 0 and self.backup_count > 0
+            position = stream.tell()
+            # Пустой файл не ротируется, даже если пачка больше max_bytes.
+            if rotate and position and position + len(data) >= self.max_bytes:
+                stream.close()
+                self._rotate()
+                stream = self._open()
+
+        stream.write(data)
+        stream.flush()
+        return stream
+
+    def _open(self):
+        if not self.filename:
+            return self._stream or sys.stdout
+        return open(self.filename, 'ab')
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f'{self.filename}.{i}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.filename}.{i + 1}')
+        os.replace(self.filename, f'{self.filename}.1')
+
+
+def flush_all():
+    """Writes out records queued in all background handlers."""
+    for handler in list(_handlers):
+        handler.flush()
+
+
+def stats() -> dict[str, int]:
+    result = {'queued': 0, 'written': 0, 'dropped': 0}
+    for handler in list(_handlers):
+        for key, value in handler.stats().items():
+            result[key] += value
+    return result
@@ -1,6 +1,5 @@
 import logging
 from collections import OrderedDict
-import asyncio
 import sys
 from lib.logger.formatter import _encode_value
 
@@ -20,24 +19,26 @@ def loglevel_gt_debug() -> bool:
 
 class Logger:
     """Логгер расширяет возможности стардартного logging.Logger,
-    добавляя в сообщение контекст (словарь)."""
+    добавляя в сообщение контекст (словарь).
+
+    Контекст логгера неизменяем: он нормализуется один раз при создании
+    и разделяется между логгерами и записями. with_fields и set_fields
+    строят новый контекст, не трогая старый. Если уровень отключен,
+    контекст сообщения не строится вовсе.
+    """
+    
+    __slots__ = ('_logger', '_ctx')
     
-    def __init__(self, logger: logging.Logger, *, use_json=False, _ctx=None, **fields):
+    def __init__(self, logger: logging.Logger, *, _ctx=None, **fields):
         """
         :param fields: key-value множество, которое будет добавлено к
         сообщению при логгировании.
         """
         self._logger = logger
-        self._ctx = _ctx or OrderedDict()
-        
-        self._ctx.update(**fields)
-        self._tasks = [] 
-        self._loop = asyncio.get_event_loop()
-        
-        self._own_ctx = True
+        self._ctx = _merge(_ctx, fields)
         
     def context(self) -> dict:
-        return self._ctx.copy()
+        return OrderedDict(self._ctx)
     
     def with_fields(self, ctx: dict = None, **fields) -> 'Logger':
         """Возвращает новый инстанс Logger, который расширяет контест self,
@@ -48,35 +49,51 @@ class Logger:
 
         :param ctx: Служит для передачи словаря в метод.
         """
-        ctx = _merge(self._ctx, ctx, fields)
-        return Logger(self._logger, _ctx=ctx)
+        logger = Logger.__new__(Logger)
+        logger._logger = self._logger
+        # Без новых полей контекст разделяется: set_fields его не меняет,
+        # а заменяет у своего логгера.
+        logger._ctx = _merge(self._ctx, ctx, fields) if ctx or fields else self._ctx
+        return logger
     
     def set_fields(self, ctx: dict = None, **fields):
         """Обновляет контекст текущего логгера."""
-        _merge(ctx, fields, dest=self._ctx)
+        if ctx or fields:
+            self._ctx = _merge(self._ctx, ctx, fields)
+    
+    def _json_format(self, ctx=None, fields=None) -> dict:
+        if not ctx and not fields:
+            return {'ctx': self._ctx}
+        return {'ctx': _merge(self._ctx, ctx, fields)}
     
-    def _json_format(self, ctx=None, **fields) -> dict:
-        fields = _merge(self._ctx, ctx, fields)
-        fields = _sort_ctx(fields)
-        return {'ctx': fields}
+    def _log(self, level, msg, ctx, fields, **kwargs):
+        # stacklevel: вызывающий код -> debug/info/... -> _log.
+        self._logger._log(level, msg, (), stacklevel=3,
+                          extra=self._json_format(ctx, fields), **kwargs)
     
     def debug(self, msg, ctx=None, **fields):
-        self._logger.debug(msg, stacklevel=2, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, ctx, fields)
 
     def info(self, msg, ctx=None, **fields):
-        self._logger.info(msg, stacklevel=2, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, ctx, fields)
 
     def warning(self, msg, ctx=None, **fields):
-        self._logger.warning(msg, stacklevel=2, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, ctx, fields)
 
     def critical(self, msg, ctx=None, **fields):
-        self._logger.critical(msg, stacklevel=2, stack_info=True, exc_info=True, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, msg, ctx, fields, stack_info=True, exc_info=True)
 
     def error(self, msg, ctx=None, **fields):
-        self._logger.error(msg, stacklevel=2, stack_info=True, exc_info=True, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, ctx, fields, stack_info=True, exc_info=True)
 
     def exception(self, msg, ctx=None, **fields):
-        self._logger.error(msg, stacklevel=2, stack_info=True, exc_info=True, extra=self._json_format(ctx, **fields))
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, ctx, fields, stack_info=True, exc_info=True)
     
     _dumb = logging.Formatter()
     
@@ -85,69 +102,55 @@ class Logger:
         return cls._dumb.formatException(sys.exc_info())
 
 
-def _sort_ctx(data: dict) -> dict:
-    """Сортирует ключи в контексте.
-    Ключи в OrderedDict не сортируются.
+def _merge(*groups) -> OrderedDict:
+    """Возвращает новый нормализованный контекст из groups.
+
+    Ключи верхнего уровня сохраняют порядок добавления, вложенные словари
+    сортируются. Исходные словари не изменяются.
     """
-    data = data.copy()
-    keys = list(data.keys())
-    if not isinstance(data, OrderedDict):
-        new_dict = OrderedDict()
-        for key in sorted(keys):
-            new_dict[key] = data[key]
-        data = new_dict
+    dest = OrderedDict()
+    for group in groups:
+        if not group:
+            continue
+        if isinstance(group, _Normalized):
+            # Уже нормализованный контекст логгера.
+            dest.update(group)
+            continue
+        for key, value in group.items():
+            dest[key if isinstance(key, str) else str(key)] = _normalize_value(value)
+    return _Normalized(dest)
 
-    for key in data:
-        if isinstance(data[key], dict):
-            data[key] = _sort_ctx(data[key])
-    return data
+
+class _Normalized(OrderedDict):
+    """Контекст, который уже прошел нормализацию."""
+    
+    __slots__ = ()
 
 
-def _merge(*fields, dest=None):
-    dest = dest if dest is not None else OrderedDict()
-    for group in fields:
-        if group:
-            _stringify_keys(group)
-            _float_to_int(group)
-            # Учитывает порядок ключей в Ordered.
-            for key in group.keys():
-                dest[key] = group[key]
-    return dest
+def _normalize_value(value):
+    if isinstance(value, float):
+        return _float_to_int(value)
+    if isinstance(value, dict):
+        return _sort_ctx(value)
+    return value
 
 
-def _stringify_keys(data: dict):
-    """ Заменяет не-str ключи их str представлениями.
+def _sort_ctx(data: dict) -> dict:
+    """Возвращает копию data с отсортированными str ключами.
 
     Важно, чтобы все ключи контекста были str!
-    При сериализации ключи сортируются в алфавитном порядке.
     Если ключи будут разных типов (например, str и int),
     то их нельзя будет сравнить и выкинется TypeError.
+    Ключи в OrderedDict не сортируются.
     """
-    keys = list(data.keys())
-    for key in keys:
-        if isinstance(data[key], dict):
-            _stringify_keys(data[key])
-
-        if not isinstance(key, str):
-            # Может менять порядок ключей в Ordered.
-            data[str(key)] = data[key]
-            del data[key]
+    items = [(k if isinstance(k, str) else str(k), _normalize_value(v)) for k, v in data.items()]
+    if not isinstance(data, OrderedDict):
+        items.sort(key=lambda item: item[0])
+    return OrderedDict(items)
 
 
-def _float_to_int(data: dict):
+def _float_to_int(f: float):
     """Приводит значения типа float к int без потери точности.
     Это позволяет уменьшить JSON, убрав пустую дробную часть.
     """
-    for key in data.keys():
-        if isinstance(data[key], dict):
-            _float_to_int(data[key])
-            continue
-
-        if not isinstance(data[key], float):
-            continue
-
-        f = data[key]
-        n = int(f)
-
-        if f == n:
-            data[key] = n
+    return int(f) if f.is_integer() else f
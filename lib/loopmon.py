@@ -0,0 +1,170 @@
+import asyncio
+import inspect
+import sys
+import threading
+from collections import deque
+from time import monotonic
+
+from lib import metrics
+from lib.logger import get_logger
+from lib.wrappers import format_frame
+
+
+_logger = get_logger('loop-monitor')
+
+_lag = metrics.histogram('event_loop_lag_seconds', 'Delay of scheduled callbacks on the event loop.',
+                         buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5.))
+_slow_callbacks = metrics.counter('event_loop_slow_callbacks_total', 'Callbacks or task steps over the threshold.')
+
+# Кадры, которые не говорят, какой код заблокировал loop.
+_skip_modules = ('asyncio.', 'uvloop', 'threading', 'uvicorn', 'starlette', 'anyio')
+
+MAX_STACK_FRAMES = 15
+
+_CO_COROUTINE = inspect.CO_COROUTINE | inspect.CO_ITERABLE_COROUTINE
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class LoopMonitor:
+    """Следит за задержками event loop.
+
+    Колбэк-пульс ставится в loop каждые interval секунд, и лаг - это
+    насколько позже запланированного он выполнился. Последние window
+    замеров дают перцентили.
+
+    Сторожевой поток проверяет, как давно был пульс. Если loop занят одним
+    колбэком или шагом задачи дольше slow_callback секунд, поток снимает
+    стек потока loop и пишет его в лог, пока колбэк еще выполняется.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600, slow_callback: float = 0.25,
+                 unhealthy_lag: float = 1., unhealthy_for: float = 10.):
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.unhealthy_lag = unhealthy_lag
+        self.unhealthy_for = unhealthy_for
+
+        self._samples: deque[float] = deque(maxlen=window)
+        self._beat = monotonic()
+        self._expected = 0.
+        self._high_since: float = None
+
+        self._loop: asyncio.AbstractEventLoop = None
+        self._loop_thread: int = None
+        self._handle: asyncio.TimerHandle = None
+        self._watchdog: threading.Thread = None
+        self._stopped = threading.Event()
+
+        self.slow_callbacks = 0
+
+    def start(self):
+        if self._loop is not None:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._schedule()
+
+        if self.slow_callback:
+            self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        self._loop = self._handle = self._watchdog = None
+
+    def _schedule(self):
+        self._beat = monotonic()
+        self._expected = self._beat + self.interval
+        self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _tick(self):
+        lag = max(0., monotonic() - self._expected)
+        self._samples.append(lag)
+        _lag.observe(lag)
+
+        if lag >= self.unhealthy_lag:
+            if self._high_since is None:
+                self._high_since = monotonic()
+        else:
+            self._high_since = None
+
+        self._schedule()
+
+    def percentiles(self) -> dict[str, float]:
+        values = sorted(self._samples)
+        return {
+            'p50': _percentile(values, 0.5),
+            'p95': _percentile(values, 0.95),
+            'p99': _percentile(values, 0.99),
+            'max': values[-1] if values else 0.,
+        }
+
+    @property
+    def healthy(self) -> bool:
+        """False if the lag stays over unhealthy_lag for unhealthy_for seconds.
+
+        The property is read on the loop itself, so a loop blocked right now
+        never gets to report it: such a loop does not answer the liveness
+        probe at all, and the probe timeout covers it.
+        """
+        if self._loop is None:
+            return True
+
+        return self._high_since is None or monotonic() - self._high_since < self.unhealthy_for
+
+    def stats(self) -> dict:
+        stats = {k: round(v, 4) for k, v in self.percentiles().items()}
+        stats['slow_callbacks'] = self.slow_callbacks
+        stats['healthy'] = self.healthy
+        return stats
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.slow_callback / 2):
+            beat = self._beat
+            blocked = monotonic() - beat - self.interval
+            if blocked < self.slow_callback or beat == reported:
+                continue
+
+            # Об одной блокировке сообщается один раз.
+            reported = beat
+            self.slow_callbacks += 1
+            _slow_callbacks.inc()
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                _logger.warning('slow callback', blocked=round(blocked, 3), **_describe_stack(frame))
+
+
+def _describe_stack(frame) -> dict:
+    """Returns the blocking coroutine, its module and the stack of the loop thread."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+
+    own = [f for f in frames if not f.f_globals.get('__name__', '').startswith(_skip_modules)]
+    coroutines = [f for f in own if f.f_code.co_flags & _CO_COROUTINE]
+
+    result = {
+        'tb': ' > '.join(map(format_frame, own[-MAX_STACK_FRAMES:])),
+    }
+    if coroutines:
+        # Задача, которая выполняется, и модуль, где она заблокировалась.
+        result['coro'] = format_frame(coroutines[0])
+        result['module'] = coroutines[-1].f_globals.get('__name__')
+    if own:
+        result['line'] = f'{own[-1].f_code.co_filename}:{own[-1].f_lineno}'
+    return result
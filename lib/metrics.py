@@ -0,0 +1,202 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Метрики живут в одном реестре процесса. Значения с метками хранятся
+в дочерних объектах, которые стоит получить через labels() один раз
+и переиспользовать на горячем пути. Для источников, у которых уже есть
+stats(), регистрируются collector-функции: они вызываются только при
+чтении /metrics.
+"""
+from bisect import bisect_left
+from typing import Callable, Hashable, Iterable, NamedTuple
+
+
+# Границы по умолчанию для длительностей в секундах.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30.)
+
+
+class Family(NamedTuple):
+    """Metric family returned by collectors."""
+    name: str
+    kind: str
+    help: str
+    # (метки, значение)
+    samples: list[tuple[dict[str, str], float]]
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.
+
+    def inc(self, amount: float = 1.):
+        self.value += amount
+
+    def dec(self, amount: float = 1.):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Buckets:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # Последний элемент - корзина +Inf.
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind: str = None
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: dict[tuple, object] = {}
+        if not labels:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Returns the child for label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f'{self.name} expects labels {self.label_names}')
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values: tuple, extra: str = '') -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.):
+        self._default.inc(amount)
+
+    def render(self):
+        for values, child in self._children.items():
+            yield f'{self.name}{self._label_text(values)} {_number(child.value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def dec(self, amount: float = 1.):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self):
+        for values, child in self._children.items():
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                total += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{self._label_text(values, le)} {total}'
+            yield f'{self.name}_sum{self._label_text(values)} {_number(child.sum)}'
+            yield f'{self.name}_count{self._label_text(values)} {child.count}'
+
+
+_metrics: dict[str, _Metric] = {}
+_collectors: dict[Hashable, Callable[[], Iterable[Family]]] = {}
+
+
+def _register(cls, name: str, help: str, labels: tuple[str, ...], **kwargs):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = cls(name, help, labels, **kwargs)
+    elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+        raise ValueError(f'metric {name} is already registered with other type or labels')
+    return metric
+
+
+def counter(name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+    return _register(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+
+def collector(func: Callable[[], Iterable[Family]], key: Hashable = None):
+    """Registers a function called on every scrape.
+
+    A function registered with the same key replaces the previous one.
+    """
+    _collectors[func if key is None else key] = func
+    return func
+
+
+def render() -> str:
+    """Returns all metrics in Prometheus text format."""
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render())
+
+    for func in _collectors.values():
+        for family in func():
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            for labels, value in family.samples:
+                pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                label_text = '{' + pairs + '}' if pairs else ''
+                lines.append(f'{family.name}{label_text} {_number(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
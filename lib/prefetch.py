@@ -0,0 +1,72 @@
+from collections import deque
+from typing import Hashable
+
+
+class PrefetchBuffer:
+    """Буфер заранее полученных значений с уровнями пополнения.
+
+    Буфер нужно пополнять, когда в нём меньше low значений, и заполнять
+    до high. Значения, выданные недавно (последние history штук), повторно
+    в буфер не попадают.
+    """
+
+    def __init__(self, low: int = 5, high: int = 20, history: int = 200):
+        self.low = low
+        self.high = high
+
+        self._items: deque = deque()
+        self._recent: deque = deque(maxlen=history)
+        self._known: set[Hashable] = set()
+
+        self.taken = 0
+        self.empty = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def needs_refill(self) -> bool:
+        return len(self._items) < self.low
+
+    @property
+    def missing(self) -> int:
+        """Returns how many values are needed to fill the buffer up to high."""
+        return max(0, self.high - len(self._items))
+
+    def put(self, item: Hashable) -> bool:
+        """Adds the value. Returns False for duplicates and recent values."""
+        if item is None or item in self._known or len(self._items) >= self.high:
+            self.rejected += 1
+            return False
+
+        self._items.append(item)
+        self._known.add(item)
+        return True
+
+    def take(self):
+        """Returns the oldest value or None if the buffer is empty."""
+        if not self._items:
+            self.empty += 1
+            return None
+
+        item = self._items.popleft()
+        self.taken += 1
+
+        if not self._recent.maxlen:
+            # История не хранится: значение можно снова добавить сразу.
+            self._known.discard(item)
+            return item
+
+        if len(self._recent) == self._recent.maxlen:
+            self._known.discard(self._recent[0])
+        self._recent.append(item)
+        return item
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._items),
+            'taken': self.taken,
+            'empty': self.empty,
+            'rejected': self.rejected,
+        }
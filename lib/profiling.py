@@ -0,0 +1,141 @@
+"""Профилирование работающего процесса по запросу.
+
+Пока профилирование не запущено, на горячем пути остается только
+проверка HandlerProfiler.active.
+"""
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Hashable
+
+from lib.wrappers import format_frame
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(format_frame(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+async def sample(duration: float, interval: float = 0.005) -> str:
+    """Samples the event loop thread stack for duration seconds.
+
+    Returns collapsed stacks, one 'frame;frame;frame count' line per stack,
+    as flamegraph.pl and speedscope expect. Сэмплы снимает отдельный поток,
+    поэтому код в loop не замедляется.
+    """
+    thread_id = threading.get_ident()
+    stacks = Counter()
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[_collapse(frame)] += 1
+
+    sampler = threading.Thread(target=run, name='profiler-sampler', daemon=True)
+    sampler.start()
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        stop.set()
+        await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class HandlerProfiler:
+    """Профилирует cProfile следующие count вызовов выбранных обработчиков.
+
+    cProfile работает на весь поток, поэтому в профиль попадает и код
+    других задач, выполнявшихся, пока обработчик ждал ввода-вывода.
+    Одновременно идет только одна сессия.
+    """
+
+    def __init__(self):
+        # Проверяется на каждом обновлении, поэтому обычный атрибут.
+        self.active = False
+
+        self._targets: frozenset[Hashable] = frozenset()
+        self._remaining = 0
+        self._running = 0
+        self._profile: cProfile.Profile = None
+        self._done: asyncio.Future = None
+
+    def watches(self, target: Hashable) -> bool:
+        return self.active and target in self._targets
+
+    async def profile(self, targets: set[Hashable], count: int, timeout: float) -> pstats.Stats | None:
+        """Waits until count calls of targets are profiled.
+
+        Returns collected stats, None if no call happened before timeout.
+        """
+        if self.active:
+            raise ProfilerBusy('profiling is already running')
+
+        self._targets = frozenset(targets)
+        self._remaining = count
+        self._running = 0
+        self._profile = cProfile.Profile()
+        self._done = asyncio.get_running_loop().create_future()
+        self.active = True
+
+        try:
+            await asyncio.wait_for(asyncio.shield(self._done), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.active = False
+            if self._running:
+                self._profile.disable()
+                self._running = 0
+
+        profile, self._profile = self._profile, None
+        if self._remaining == count:
+            return None
+        return pstats.Stats(profile)
+
+    async def run(self, call: Callable[[], Awaitable]):
+        """Runs the handler call under the profiler."""
+        profile = self._profile
+        if not self.active or self._remaining <= 0:
+            return await call()
+
+        self._remaining -= 1
+        if self._running == 0:
+            profile.enable()
+        self._running += 1
+        try:
+            return await call()
+        finally:
+            # Сессия могла завершиться по таймауту, пока шел вызов.
+            if profile is self._profile:
+                self._running -= 1
+                if self._running == 0:
+                    profile.disable()
+                    if self._remaining <= 0 and not self._done.done():
+                        self._done.set_result(None)
+
+
+def format_stats(stats: pstats.Stats, sort: str = 'cumulative', limit: int = 50) -> str:
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def dump_stats(stats: pstats.Stats) -> bytes:
+    """Returns stats in the .prof format readable by pstats and snakeviz."""
+    return marshal.dumps(stats.stats)
@@ -0,0 +1,43 @@
+class MarkerScanner:
+    """Ищет значения вида <marker>...<end> в потоке байтов.
+
+    Значение может быть разрезано границей чанков: незавершённый хвост
+    сохраняется до следующего feed(). Значения длиннее max_value
+    отбрасываются, чтобы буфер не рос неограниченно.
+    """
+
+    def __init__(self, marker: bytes, end: bytes = b'"', include_marker: bool = True, max_value: int = 4096):
+        self.marker = marker
+        self.end = end
+        self.include_marker = include_marker
+        self.max_value = max_value
+
+        self._buf = b''
+        self.scanned = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Returns values completed by the chunk."""
+        self.scanned += len(chunk)
+        buf = self._buf + chunk if self._buf else chunk
+
+        found = []
+        pos = 0
+        while True:
+            start = buf.find(self.marker, pos)
+            if start == -1:
+                # Маркер может начинаться в конце буфера.
+                keep = max(pos, len(buf) - len(self.marker) + 1)
+                self._buf = buf[keep:]
+                return found
+
+            after = start + len(self.marker)
+            stop = buf.find(self.end, after)
+            if stop == -1:
+                if len(buf) - after > self.max_value:
+                    pos = after
+                    continue
+                self._buf = buf[start:]
+                return found
+
+            found.append(buf[start if self.include_marker else after:stop])
+            pos = stop + len(self.end)
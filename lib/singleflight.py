@@ -0,0 +1,40 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Объединяет одновременные одинаковые вызовы в один.
+
+    Пока вызов с ключом key выполняется, остальные вызовы с тем же ключом
+    ждут его результата, а не выполняются заново.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+        # Сколько вызовов не было выполнено благодаря объединению.
+        self.saved = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Исключение без ожидающих не должно попадать в лог asyncio.
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is not None:
+            self.saved += 1
+        else:
+            # Вызов выполняется отдельной задачей: отмена первого вызвавшего
+            # не отменяет его для остальных.
+            task = asyncio.ensure_future(func())
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._calls[key] = task
+
+        return await asyncio.shield(task)
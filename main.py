@@ -1,12 +1,16 @@
 from lib.bot.logpoll import LongPollBot
 from src.context import Context
 from lib.config.config import parse_config
+from lib import breaker, connectors, journal
+from lib.http_cache import ResponseCache
 import asyncio
 import uvicorn
 import uvloop
 import argparse
 import logging.config
 from lib.bot.client import BotClient
+from lib.bot.scheduler import SendScheduler
+from lib.bot.file_cache import FileIdCache
 from src.clients import (
     Anime,
     Pinterest,
@@ -21,28 +25,65 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--config', '-c', help='path to config file', default='config.yaml')
 
 
-def main():
-    args = parser.parse_args()
+def build(config: dict) -> SuperBot:
+    """Creates clients, the context and the bot from the parsed config."""
+    connectors.configure(config['clients']['connectors'])
+    breaker.configure(config['clients']['circuit_breaker'])
     
-    config = parse_config(args.config)
-    logging.config.dictConfig(config['logging'])
+    capture = config['bot']['capture']
+    if capture['enable']:
+        journal.start_recording(capture['filename'], queue_size=capture['queue_size'])
     
-    development = config['development']
-    if development:
-        version = bot_version + '-dev'
-    else:
-        version = bot_version
-
-    anime = Anime()
+    response_cache = None
+    http_cache_config = config['clients']['http_cache']
+    if http_cache_config['enable']:
+        response_cache = ResponseCache(
+            max_bytes=http_cache_config['max_bytes'],
+            directory=http_cache_config['directory'] or None,
+            disk_max_bytes=http_cache_config['disk_max_bytes'],
+        )
+    
+    anime = Anime(response_cache=response_cache)
     pinterest_shuffle = PinterestShuffle(
         url=config['clients']['pinterest']['url'],
-        cookie=config['clients']['pinterest']['cookie']
+        cookie=config['clients']['pinterest']['cookie'],
+        response_cache=response_cache,
+    )
+    pinterest = Pinterest(
+        browser_pages=config['clients']['pinterest']['browser_pages'],
+        browser_idle_timeout=config['clients']['pinterest']['browser_idle_timeout'],
+        search_cache_size=config['clients']['pinterest']['search_cache_size'],
+        search_cache_ttl=config['clients']['pinterest']['search_cache_ttl'],
+        pin_cache_size=config['clients']['pinterest']['pin_cache_size'],
+        pin_cache_ttl=config['clients']['pinterest']['pin_cache_ttl'],
+        response_cache=response_cache,
     )
-    pinterest = Pinterest()
+    
+    scheduler = None
+    rate_limit = config['bot']['rate_limit']
+    if rate_limit['enable']:
+        scheduler = SendScheduler(
+            global_per_second=rate_limit['global_per_second'],
+            chat_per_second=rate_limit['chat_per_second'],
+            chat_burst=rate_limit['chat_burst'],
+            group_per_minute=rate_limit['group_per_minute'],
+            max_attempts=rate_limit['max_attempts'],
+        )
+    
+    file_cache = None
+    file_cache_config = config['bot']['file_id_cache']
+    if file_cache_config['enable']:
+        file_cache = FileIdCache(
+            filename=file_cache_config['filename'],
+            maxsize=file_cache_config['size'],
+        )
+        file_cache.load()
     
     bot = BotClient(
         token=config['bot']['token'],
-        name=config['bot']['name']
+        name=config['bot']['name'],
+        scheduler=scheduler,
+        file_cache=file_cache,
     )
     longpollbot = LongPollBot(
         token=config['bot']['token'],
@@ -56,7 +97,22 @@ def main():
         pinterest=pinterest
     )
     
-    superbot = SuperBot(bot, longpollbot, config)
+    return SuperBot(bot, longpollbot, config)
+
+
+def main():
+    args = parser.parse_args()
+    
+    config = parse_config(args.config)
+    logging.config.dictConfig(config['logging'])
+    
+    development = config['development']
+    if development:
+        version = bot_version + '-dev'
+    else:
+        version = bot_version
+
+    superbot = build(config)
     
     uvicorn.run(
         superbot.app, 
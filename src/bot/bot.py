@@ -1,20 +1,32 @@
 import asyncio
-from datetime import timedelta
-import re
-import os
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .chat import Chat
+from .router import CommandRouter
+from .dispatcher import UpdateDispatcher
+from .checkpoint import OffsetCheckpoint
+from .poller import UpdatePoller
+from .ingest import IngestQueue, OverloadPolicy
+from .retry import RetryBudget, is_retriable, retry_delay
+from .deadletter import DeadLetterLog
+from . import telemetry
 
 import importlib
 import cerberus
+from time import monotonic
+from lib import breaker, connectors, journal, metrics
 from lib.bot import models
+from lib.bot.decoding import RawUpdate
 from lib.bot.client import BotClient
 from lib.bot.logpoll import LongPollBot
 from lib.logger import get_logger
+from lib.logger import handlers as log_handlers
+from lib.loopmon import LoopMonitor
+from lib import profiling
+from src.context import Context
 from src.modules.base import BaseModule
 from typing import Iterable
 from src.utils import make_periodic
-from lib.bot.errors import TelegramError
 from lib.wrappers import extend_ctx
 
 
@@ -22,30 +34,19 @@ version = '0.2.0'
 
 
 _logger = get_logger('bot.super')
-_command_re = re.compile(r'\/[a-z_]+')
 
-UPDATES_RETRIES_COUNT = 15
+_updates_received = metrics.counter('bot_updates_received_total', 'Updates taken for processing.')
+_updates_processed = metrics.counter('bot_updates_total', 'Processed updates by outcome.', ('outcome',))
+_update_duration = metrics.histogram('bot_update_duration_seconds', 'Update processing time including retries.')
+_commands = metrics.counter('bot_commands_total', 'Matched commands.', ('module', 'handler'))
+_handler_duration = metrics.histogram('bot_handler_duration_seconds', 'Command handler latency.', ('module', 'handler'))
+_handler_errors = metrics.counter('bot_handler_errors_total', 'Failed command handler calls.', ('module', 'handler'))
 
 
 class ModuleError(Exception):
     pass
 
 
-def _re_search(pattern, string):
-    # Паттерн команды проверяется с учётом регистра.
-    return re.search(pattern, string, re.DOTALL)
-
-
-def insert_bot_name(name, command_pattern):
-    """Returns a new command pattern mentioning bot explicitly."""
-    matches = list(_command_re.finditer(command_pattern))
-    
-    if not len(matches):
-        return command_pattern
-    _, end = matches[0].span()
-    return command_pattern[:end] + f'@{name}' + command_pattern[end:]
-
-
 def handler(func, self):
     
     async def run(*args, **kwargs):
@@ -72,32 +73,183 @@ class SuperBot:
         self.config = config
     
         self._tasks = []
-        self._commands = []
+        self._router = CommandRouter(bot.name)
         self._modules = []
         
         self.app.on_event('startup')(self.startup)
         self.app.on_event('shutdown')(self.shutdown)
         self.app.post('/updates')(self.process_update_handler)
         
-        offset = 0
-        offset_file = self.config['bot'].get('offset_file')
-        if offset_file and os.path.exists(offset_file):
-            with open(offset_file, 'r') as file:
-                offset = int(file.read())
+        self.checkpoint = OffsetCheckpoint(
+            self.config['bot'].get('offset_file'),
+            interval=self.config['bot'].get('offset_flush_interval', 1.),
+            max_updates=self.config['bot'].get('offset_flush_updates', 100),
+        )
+        self.offset = self.checkpoint.load()
+        self.dispatcher: UpdateDispatcher = None
+        self.poller: UpdatePoller = None
+        self.ingest: IngestQueue = None
+        
+        self.retries = self.config['bot']['retries']
+        self.retry_budget = RetryBudget(
+            ratio=self.retries['budget_ratio'],
+            min_per_second=self.retries['budget_per_second'],
+        )
+        self.dead_letters = DeadLetterLog(self.config['bot'].get('dead_letter_file'))
+        
+        self.app.get('/api/bot/dead_letters')(self.dead_letters_handler)
+        self.app.post('/api/bot/dead_letters/replay')(self.replay_dead_letters_handler)
+        self.app.get('/api/bot/upstreams')(self.upstreams_handler)
+        self.app.get('/metrics')(self.metrics_handler)
+        self.app.get('/health/live')(self.liveness_handler)
+        self.app.get('/health/ready')(self.readiness_handler)
+        self.app.post('/api/bot/profile/sample')(self.profile_sample_handler)
+        self.app.post('/api/bot/profile/updates')(self.profile_updates_handler)
+        
+        self.profiler = profiling.HandlerProfiler()
+        
+        self.loop_monitor: LoopMonitor = None
+        monitor = self.config['bot'].get('loop_monitor', {})
+        if monitor.get('enable', True):
+            self.loop_monitor = LoopMonitor(
+                interval=monitor.get('interval', 0.1),
+                window=monitor.get('window', 600),
+                slow_callback=monitor.get('slow_callback', 0.25),
+                unhealthy_lag=monitor.get('unhealthy_lag', 1.),
+                unhealthy_for=monitor.get('unhealthy_for', 10.),
+            )
+        # Модули загружены и обновления принимаются.
+        self.ready = False
+        
+        # Обработчик -> метки (модуль, обработчик) для метрик.
+        self._handler_labels: dict = {}
+        # Метрики последнего созданного бота: прежний collector заменяется.
+        metrics.collector(lambda: telemetry.collect(self), key='bot')
+        
+    async def process_update_handler(self, request: Request):
+        if self.ingest is None:
+            # В режиме polling вебхук не используется.
+            return Response(status_code=404)
+        
+        body = await request.body()
         
-        self.offset = offset
+        if not await self.ingest.put(body):
+            if self.ingest.policy == OverloadPolicy.reject:
+                # Telegram повторит доставку позже.
+                return Response(status_code=429)
         
-    async def process_update_handler(self, request: models.Update, bg: BackgroundTasks):
-        bg.add_task(self._process_update(request))  
         return
     
+    async def dead_letters_handler(self):
+        entries = await self.dead_letters.entries()
+        return [
+            {k: entry.get(k) for k in ('time', 'update_id', 'attempts', 'error')}
+            for entry in entries
+        ]
+    
+    async def replay_dead_letters_handler(self):
+        # Повторы идут через диспетчер: с порядком внутри чата и без
+        # ожидания обработки в запросе.
+        count = await self.dead_letters.replay(lambda update: self.dispatcher.submit(update, replay=True))
+        return {'replayed': count}
+    
+    async def upstreams_handler(self):
+        return breaker.stats()
+    
+    def _health(self, ok: bool) -> Response:
+        body = {'status': 'ok' if ok else 'unhealthy'}
+        if self.loop_monitor is not None:
+            body['loop'] = self.loop_monitor.stats()
+        return JSONResponse(body, status_code=200 if ok else 503)
+    
+    async def liveness_handler(self):
+        return self._health(self.loop_monitor is None or self.loop_monitor.healthy)
+    
+    async def readiness_handler(self):
+        if not self.ready:
+            return JSONResponse({'status': 'not ready'}, status_code=503)
+        return await self.liveness_handler()
+    
+    async def profile_sample_handler(self, seconds: float = 10., interval: float = 0.005):
+        """Samples the event loop for seconds, returns collapsed stacks."""
+        seconds = min(max(seconds, 0.1), 300.)
+        return PlainTextResponse(await profiling.sample(seconds, max(interval, 0.001)))
+    
+    async def profile_updates_handler(self, command: str, count: int = 1, timeout: float = 300.,
+                                      format: str = 'text', sort: str = 'cumulative', limit: int = 50):
+        """Profiles the next count updates of the command with cProfile.
+        
+        format=text returns the pstats report, format=prof - a file for
+        pstats.Stats or snakeviz.
+        """
+        command = '/' + command.lstrip('/')
+        handlers = self._router.handlers(command)
+        if not handlers:
+            return JSONResponse({'detail': f'unknown command {command}'}, status_code=404)
+        
+        try:
+            stats = await self.profiler.profile(set(handlers), max(count, 1), timeout)
+        except profiling.ProfilerBusy as e:
+            return JSONResponse({'detail': str(e)}, status_code=409)
+        
+        if stats is None:
+            return JSONResponse({'detail': f'no {command} updates in {timeout}s'}, status_code=408)
+        
+        if format == 'prof':
+            return Response(profiling.dump_stats(stats), media_type='application/octet-stream')
+        return PlainTextResponse(profiling.format_stats(stats, sort, limit))
+    
+    async def metrics_handler(self):
+        return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+    
+    async def _ingest_update(self, body: bytes):
+        update = RawUpdate.from_bytes(body)
+        await self._submit(update)
+    
+    async def _submit(self, update: RawUpdate):
+        accepted = await self.dispatcher.submit(update)
+        # В журнал попадают только принятые обновления: повторы от Telegram
+        # воспроизводились бы как новые.
+        if accepted and journal.recorder is not None:
+            journal.recorder.record_update(update.data)
+    
     async def shutdown(self):
+        self.ready = False
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        
+        if self.ingest:
+            await self.ingest.close()
+        
+        if self.dispatcher:
+            await self.dispatcher.close()
+        
+        if self.poller:
+            self.checkpoint.advance(self.dispatcher.committed_offset)
+        await self.checkpoint.close()
+        
         await self.bot.close()
+        await self.longpollbot.close()
         
         for module in self._modules:
             await module.close()
+        
+        await connectors.close_all()
+        
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
+        
+        _logger.info('stopped', dropped_logs=log_handlers.stats()['dropped'])
+        # Записи из очередей фоновых обработчиков не должны потеряться.
+        await asyncio.get_running_loop().run_in_executor(None, journal.stop_recording)
+        await asyncio.get_running_loop().run_in_executor(None, log_handlers.flush_all)
     
     async def startup(self):
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        
         modules = []
         
         for module in self.config['modules']:
@@ -113,14 +265,13 @@ class SuperBot:
             m_class: type[BaseModule] = getattr(co_module, co_class_name)
 
             if m_class.CONFIG_SCHEME:
-                if not module_config:
-                    raise ModuleError(f'{m_class.__name__} config is required')
-                
+                # Обязательные поля описываются в схеме, остальные
+                # заполняются значениями по умолчанию.
                 validator = cerberus.Validator(m_class.CONFIG_SCHEME)
-                if not validator.validate(module_config):
-                    raise ModuleError(validator.errors)
+                if not validator.validate(module_config or {}):
+                    raise ModuleError(f'{m_class.__name__} config is invalid: {validator.errors}')
                 
-                module_config = validator.normalized(module_config)
+                module_config = validator.normalized(module_config or {})
                 
                 module = m_class(module_config)
                 modules.append(module)
@@ -132,43 +283,121 @@ class SuperBot:
         for module in modules:
             self._register_module(module)
         
-        if self.config['bot'].get('polling_mode', False):
-            self._tasks.append(
-                asyncio.create_task(make_periodic(timedelta(seconds=1), self.pull_process_updates, _logger)())
+        if self.bot.file_cache is not None:
+            interval = self.config['bot']['file_id_cache']['flush_interval']
+            coro = make_periodic(interval, self.bot.file_cache.flush, _logger)
+            self._tasks.append(asyncio.create_task(coro()))
+        
+        for conflict in self._router.conflicts:
+            _logger.warning('command pattern conflict', conflict=conflict)
+        
+        polling_mode = self.config['bot'].get('polling_mode', False)
+        self.dispatcher = UpdateDispatcher(
+            self._process_update,
+            workers=self.config['bot'].get('workers', 8),
+            max_pending=self.config['bot'].get('max_pending_updates', 1000),
+            on_commit=self.checkpoint.advance if polling_mode else None,
+            # Вебхук не гарантирует порядок повторных доставок.
+            dedupe=polling_mode,
+        )
+        self.dispatcher.start()
+        
+        if not polling_mode:
+            webhook = self.config['bot'].get('webhook', {})
+            self.ingest = IngestQueue(
+                self._ingest_update,
+                size=webhook.get('queue_size', 1000),
+                workers=webhook.get('workers', 2),
+                policy=webhook.get('overload_policy', OverloadPolicy.block),
+            )
+            self.ingest.start()
+        
+        if polling_mode:
+            self.dispatcher.next_offset = self.offset
+            self.checkpoint.start()
+            
+            self.poller = UpdatePoller(
+                self.longpollbot,
+                self._submit,
+                offset=self.offset,
+                limit=self.config['bot'].get('poll_limit', 100),
+                timeout=self.config['bot'].get('poll_timeout', 50),
             )
+            self._tasks.append(asyncio.create_task(self.poller.run()))
+        
+        # TLS соединение с Telegram открывается заранее.
+        await self.bot.warmup()
+        # Соединения с апстримами модулей открываются в фоне: готовность
+        # бота от них не зависит.
+        self._tasks.append(asyncio.create_task(self._warmup_upstreams()))
+        
+        self.ready = True
         
         _logger.info('initialized')
     
-    async def pull_process_updates(self, ctx=None):
-        updates = await self.longpollbot.get_updates(self.offset)
+    async def _warmup_upstreams(self):
+        """Opens connections to pic.re and pinshuffle.
         
-        if not updates:
+        Pinterest search runs in the browser, and pin pages are fetched by
+        urls found on the shuffled pages, so their hosts are not known
+        in advance.
+        """
+        if Context not in Context._instances:
             return
         
-        for update in updates:
-            await self._process_update(update)
-            self.offset = update.update_id + 1
-            
-            self._save_offset()
+        context = Context()
+        await asyncio.gather(context.anime.warmup(), context.pinterest_shuffle.warmup())
     
-    async def _process_update(self, update: models.Update):
+    async def _process_update(self, update: RawUpdate):
         logger = _logger.with_fields(_will_be_retried=True, update=update.update_id)
+        
+        _updates_received.inc()
+        
+        # Модель строится только для сообщений с командами.
+        if not update.has_command():
+            logger.debug('update ignored')
+            _updates_processed.labels('ignored').inc()
+            return
+        
         logger.info('processing update')
         
-        for i in range(UPDATES_RETRIES_COUNT):
+        self.retry_budget.on_request()
+        started = monotonic()
+        
+        attempt = 0
+        while True:
             try:
-                return await self._process_update_with_exc(
-                    update=update,
+                result = await self._process_update_with_exc(
+                    update=update.model,
                     logger=logger
                 )
-            except TelegramError as e:
-                logger.error('unexpected telegram error', error=e)
+                _updates_processed.labels('processed').inc()
+                _update_duration.observe(monotonic() - started)
+                return result
             except Exception as e:
-                logger.error('update processing error', error=e, **extend_ctx(logger))
-                if i == UPDATES_RETRIES_COUNT - 2:
-                    logger = logger.with_fields(_will_be_retried=False)
-                continue
+                error = e
+            
+            attempt += 1
+            if not is_retriable(error):
+                logger.error('update processing error', _will_be_retried=False,
+                             error=error, **extend_ctx(logger))
+                _updates_processed.labels('failed').inc()
+                _update_duration.observe(monotonic() - started)
+                return
+            
+            if attempt >= self.retries['attempts'] or not self.retry_budget.try_spend():
+                break
+            
+            delay = retry_delay(error, attempt, self.retries['backoff_base'], self.retries['backoff_max'])
+            logger.warning('update processing error', error=error, attempt=attempt, delay=delay)
+            await asyncio.sleep(delay)
         
+        logger.error('update retries exhausted', _will_be_retried=False,
+                     error=error, attempt=attempt, budget=self.retry_budget.tokens)
+        _updates_processed.labels('dead_letter').inc()
+        _update_duration.observe(monotonic() - started)
+        await self.dead_letters.append(update, error, attempt)
+    
     async def _process_update_with_exc(self, update: models.Update, logger=_logger):
         for part in ['message', 'edited_message', 'channel_post', 'edited_channel_post']:
             attr = getattr(update, part, None)
@@ -195,10 +424,20 @@ class SuperBot:
                         author=message.from_.username,
                         text=message.text)
         
-            for pattern, handler in self._commands:
-                match = _re_search(pattern, message.text)
-                if match:
+            handler, match = self._router.resolve(message)
+            if handler:
+                labels = self._handler_labels.get(handler) or ('', handler.__name__)
+                _commands.labels(*labels).inc()
+                started = monotonic()
+                try:
+                    if self.profiler.active and self.profiler.watches(handler):
+                        return await self.profiler.run(lambda: handler(chat, match, ctx=logger.context()))
                     return await handler(chat, match, ctx=logger.context())
+                except Exception:
+                    _handler_errors.labels(*labels).inc()
+                    raise
+                finally:
+                    _handler_duration.labels(*labels).observe(monotonic() - started)
     
     def _register_module(self, module: BaseModule):
         for pattern, command in module.commands:
@@ -213,11 +452,8 @@ class SuperBot:
             self._tasks.append(task)
     
     def _register_command(self, pattern, command, module: BaseModule = None):
-        if self.bot.name:
-            with_mention = insert_bot_name(self.bot.name, pattern)
-            self._commands.append((with_mention, command))
-        
-        self._commands.append((pattern, command))
+        self._router.add(pattern, command)
+        self._handler_labels[command] = (module.name if module else '', command.__name__)
     
     def _register_api(self, path: str, api_handler, method: str, module: BaseModule):
         path = path.lstrip('/')
@@ -236,11 +472,3 @@ class SuperBot:
             app_method = self.app.put
         
         app_method(path)(api_handler)
-    
-    def _save_offset(self):
-        offset_file = self.config['bot'].get('offset_file')
-        if not offset_file:
-            return
-        
-        with open(offset_file, 'w') as file:
-            file.write(str(self.offset))
\ No newline at end of file
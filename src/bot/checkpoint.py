@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+from lib.files import write_atomic
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.checkpoint')
+
+
+class OffsetCheckpoint:
+    """Сохраняет смещение обновлений на диск пачками.
+
+    advance() только запоминает смещение в памяти. Запись происходит, когда
+    с прошлой записи прошло interval секунд или накопилось max_updates
+    продвижений. Файл пишется атомарно в executor, не блокируя event loop.
+    """
+
+    def __init__(self, filename: str = None, interval: float = 1., max_updates: int = 100):
+        self.filename = filename
+        self.interval = interval
+        self.max_updates = max_updates
+
+        self.offset = 0
+        self.persisted = 0
+
+        self._advances = 0
+        self._dirty = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+
+    def load(self) -> int:
+        """Reads the persisted offset. Returns 0 if there is no file."""
+        if self.filename and os.path.exists(self.filename):
+            with open(self.filename, 'r') as file:
+                content = file.read().strip()
+            if content:
+                self.offset = self.persisted = int(content)
+
+        return self.offset
+
+    @property
+    def lag(self) -> int:
+        """How many update ids the persisted offset is behind the memory."""
+        return self.offset - self.persisted
+
+    def start(self):
+        if self.filename and not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    def advance(self, offset: int):
+        if offset <= self.offset:
+            return
+
+        self.offset = offset
+        self._advances += 1
+
+        self._dirty.set()
+        if self._advances >= self.max_updates:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._dirty.clear()
+            self._full.clear()
+            self._advances = 0
+
+            try:
+                await self.flush()
+            except Exception as e:
+                _logger.error('cannot save offset', offset=self.offset, error=e)
+
+    async def flush(self):
+        if not self.filename:
+            return
+
+        async with self._lock:
+            offset = self.offset
+            if offset == self.persisted:
+                return
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, write_atomic, self.filename, str(offset).encode())
+            self.persisted = offset
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await self.flush()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable
+
+from lib.bot.decoding import RawUpdate
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.dead-letters')
+
+
+def _append(filename: str, line: bytes):
+    with open(filename, 'ab') as file:
+        file.write(line)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def _read(filename: str) -> list[dict]:
+    if not os.path.exists(filename):
+        return []
+
+    entries = []
+    with open(filename, 'rb') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Хвост записи, оборванной при падении процесса.
+                _logger.warning('skipped broken dead letter')
+    return entries
+
+
+def _take_for_replay(filename: str, replaying: str) -> list[dict]:
+    """Moves the log aside and returns entries to replay."""
+    if os.path.exists(filename):
+        if os.path.exists(replaying):
+            # Остаток повтора, прерванного падением процесса.
+            with open(filename, 'rb') as file:
+                _append(replaying, file.read())
+            os.remove(filename)
+        else:
+            os.replace(filename, replaying)
+    return _read(replaying)
+
+
+def _finish_replay(filename: str, replaying: str, rest: list[dict]):
+    if rest:
+        lines = b''.join(json.dumps(entry, ensure_ascii=False).encode() + b'\n' for entry in rest)
+        _append(filename, lines)
+    if os.path.exists(replaying):
+        os.remove(replaying)
+
+
+class DeadLetterLog:
+    """Журнал обновлений, которые не удалось обработать.
+
+    Каждая запись - строка JSON с исходным обновлением и ошибкой. Журнал
+    можно переиграть через replay(), например после восстановления
+    апстрима.
+    """
+
+    def __init__(self, filename: str = None):
+        self.filename = filename
+        self._lock = asyncio.Lock()
+
+        self.written = 0
+
+    async def append(self, update: RawUpdate, error: Exception, attempts: int):
+        if not self.filename:
+            return
+
+        entry = {
+            'time': time.time(),
+            'update_id': update.update_id,
+            'attempts': attempts,
+            'error': f'{type(error).__name__}: {error}',
+            'update': update.data,
+        }
+        line = json.dumps(entry, ensure_ascii=False).encode() + b'\n'
+
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            await loop.run_in_executor(None, _append, self.filename, line)
+        self.written += 1
+
+    async def entries(self) -> list[dict]:
+        if not self.filename:
+            return []
+
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            return await loop.run_in_executor(None, _read, self.filename)
+
+    async def replay(self, submit: Callable[[RawUpdate], Awaitable]) -> int:
+        """Submits all dead letters again. Returns number of replayed updates.
+
+        Журнал переносится в <filename>.replaying и удаляется, когда все
+        записи переданы в submit. Если повтор прерван, оставшиеся записи
+        возвращаются в журнал, а после падения процесса файл .replaying
+        подхватывается следующим повтором. Обновления, упавшие снова,
+        записываются в журнал заново.
+        """
+        if not self.filename:
+            return 0
+
+        replaying = self.filename + '.replaying'
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            entries = await loop.run_in_executor(None, _take_for_replay, self.filename, replaying)
+
+        done = 0
+        try:
+            for entry in entries:
+                await submit(RawUpdate(entry['update']))
+                done += 1
+        finally:
+            rest = entries[done:]
+            async with self._lock:
+                await asyncio.shield(loop.run_in_executor(None, _finish_replay, self.filename, replaying, rest))
+            if rest:
+                _logger.warning('dead letters replay interrupted', replayed=done, restored=len(rest))
+
+        _logger.info('dead letters replayed', count=done)
+        return done
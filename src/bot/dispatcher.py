@@ -0,0 +1,141 @@
+import asyncio
+from collections import Counter, deque
+from typing import Awaitable, Callable
+
+from lib.bot.decoding import RawUpdate
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.dispatcher')
+
+class UpdateDispatcher:
+    """Обрабатывает обновления параллельно, сохраняя порядок внутри чата.
+
+    Обновления раскладываются по очередям чатов. Очередь чата в каждый момент
+    обслуживает не больше одного воркера, поэтому сообщения одного чата
+    обрабатываются по порядку, а разные чаты - параллельно.
+
+    Смещение считается по наименьшему незавершённому update_id: всё, что
+    меньше committed_offset, уже обработано. Повторы (replay=True) в расчете
+    смещения не участвуют: их update_id давно подтверждены.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[RawUpdate], Awaitable],
+        workers: int = 8,
+        max_pending: int = 1000,
+        on_commit: Callable[[int], None] = None,
+        dedupe: bool = True,
+    ):
+        self._process = process
+        self.dedupe = dedupe
+        self._on_commit = on_commit
+        self.workers = workers
+        self.max_pending = max_pending
+
+        # Очередь чата: (обновление, повтор ли это).
+        self._chats: dict[int | None, deque[tuple[RawUpdate, bool]]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        # update_id -> сколько раз принят: без dedupe один id может прийти дважды.
+        self._pending: Counter[int] = Counter()
+        # Все незавершенные обновления, вместе с повторами.
+        self._active = 0
+        self._space = asyncio.Condition()
+        self._tasks: list[asyncio.Task] = []
+
+        # Следующий update_id, который ещё не был принят.
+        self.next_offset = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+
+    @property
+    def pending(self) -> int:
+        return self._active
+
+    @property
+    def committed_offset(self) -> int:
+        """Returns the lowest update_id that is not processed yet."""
+        if self._pending:
+            return min(self._pending)
+        return self.next_offset
+
+    async def submit(self, update: RawUpdate, replay: bool = False) -> bool:
+        """Enqueues the update. Waits if there are too many pending updates.
+        
+        replay=True skips the duplicate check, e.g. for dead letters.
+        Returns False if the update was dropped as a duplicate.
+        """
+        if self.dedupe and not replay and update.update_id < self.next_offset:
+            # Уже принято: Telegram повторно отдал обновление.
+            return False
+
+        async with self._space:
+            await self._space.wait_for(lambda: self.pending < self.max_pending)
+            self._active += 1
+            if not replay:
+                self.next_offset = max(self.next_offset, update.update_id + 1)
+                self._pending[update.update_id] += 1
+
+        chat_id = update.chat_id
+        queue = self._chats.get(chat_id)
+        if queue is not None:
+            # Чат уже обслуживается воркером или ждёт его.
+            queue.append((update, replay))
+            return True
+
+        self._chats[chat_id] = deque([(update, replay)])
+        self._ready.put_nowait(chat_id)
+        return True
+
+    async def join(self):
+        """Waits until all submitted updates are processed."""
+        async with self._space:
+            await self._space.wait_for(lambda: not self.pending)
+
+    async def _worker(self, number: int):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+
+            while queue:
+                update, replay = queue[0]
+                try:
+                    await self._process(update)
+                except Exception as e:
+                    _logger.error('update processing failed',
+                                  update=update.update_id, worker=number, error=e)
+                finally:
+                    queue.popleft()
+                    await self._done(update.update_id, replay)
+
+            del self._chats[chat_id]
+
+    async def _done(self, update_id: int, replay: bool = False):
+        async with self._space:
+            committed = self.committed_offset
+            self._active -= 1
+            if not replay:
+                self._pending[update_id] -= 1
+                if not self._pending[update_id]:
+                    del self._pending[update_id]
+            self._space.notify_all()
+
+        if self._on_commit and self.committed_offset != committed:
+            self._on_commit(self.committed_offset)
+
+    async def close(self, timeout: float = 10.):
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            _logger.warning('pending updates were not processed', pending=self.pending)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
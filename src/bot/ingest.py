@@ -0,0 +1,114 @@
+import asyncio
+from collections import deque
+from enum import Enum
+from time import monotonic
+from typing import Awaitable, Callable
+
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.ingest')
+
+
+class OverloadPolicy(str, Enum):
+    # Запрос ждёт, пока в очереди не освободится место.
+    block = 'block'
+    # Новое обновление отбрасывается, Telegram получает 200.
+    shed = 'shed'
+    # Telegram получает 429 и доставит обновление повторно.
+    reject = 'reject'
+
+
+class IngestQueue:
+    """Ограниченная очередь входящих тел запросов вебхука.
+
+    Обработчик запроса только кладёт байты в очередь и сразу отвечает.
+    Пул воркеров разбирает очередь и передаёт тела в handle.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[bytes], Awaitable],
+        size: int = 1000,
+        workers: int = 2,
+        policy: OverloadPolicy = OverloadPolicy.block,
+    ):
+        self._handle = handle
+        self.size = size
+        self.workers = workers
+        self.policy = OverloadPolicy(policy)
+
+        self._queue: asyncio.Queue = asyncio.Queue(size)
+        # Время постановки в очередь, в том же порядке, что и очередь.
+        self._times: deque[float] = deque()
+        self._tasks: list[asyncio.Task] = []
+
+        self.accepted = 0
+        self.dropped = 0
+        self.wait_max = 0.
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def oldest_age(self) -> float:
+        """Returns how long the oldest queued body waits, in seconds."""
+        if not self._times:
+            return 0.
+        return monotonic() - self._times[0]
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'oldest_age': round(self.oldest_age, 3),
+            'accepted': self.accepted,
+            'dropped': self.dropped,
+            'wait_max': round(self.wait_max, 3),
+        }
+
+    async def put(self, body: bytes) -> bool:
+        """Enqueues the body. Returns False if it was not accepted."""
+        if self.policy == OverloadPolicy.block:
+            await self._queue.put(body)
+        else:
+            try:
+                self._queue.put_nowait(body)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                _logger.warning('queue is full', policy=self.policy.value, depth=self.depth)
+                return False
+
+        self._times.append(monotonic())
+        self.accepted += 1
+        return True
+
+    async def _worker(self, number: int):
+        while True:
+            body = await self._queue.get()
+            self.wait_max = max(self.wait_max, monotonic() - self._times.popleft())
+
+            try:
+                await self._handle(body)
+            except Exception as e:
+                _logger.error('cannot handle update', worker=number, error=e)
+            finally:
+                self._queue.task_done()
+
+    async def close(self, timeout: float = 10.):
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            _logger.warning('queued updates were not handled', depth=self.depth)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,118 @@
+import asyncio
+from time import monotonic
+from typing import Awaitable, Callable
+
+from lib.bot.decoding import RawUpdate
+from lib.bot.logpoll import LongPollBot
+from lib.logger import get_logger
+
+
+_logger = get_logger('bot.poller')
+
+
+class PollStats:
+    """Статистика запросов getUpdates."""
+
+    def __init__(self):
+        self.polls = 0
+        self.errors = 0
+        self.updates = 0
+
+        self.last_rtt = 0.
+        self.max_rtt = 0.
+        self.total_rtt = 0.
+
+        self.last_batch = 0
+        self.max_batch = 0
+
+    def observe(self, rtt: float, batch: int):
+        self.polls += 1
+        self.updates += batch
+
+        self.last_rtt = rtt
+        self.max_rtt = max(self.max_rtt, rtt)
+        self.total_rtt += rtt
+
+        self.last_batch = batch
+        self.max_batch = max(self.max_batch, batch)
+
+    def as_dict(self) -> dict:
+        polls = self.polls or 1
+        return {
+            'polls': self.polls,
+            'errors': self.errors,
+            'updates': self.updates,
+            'rtt_last': round(self.last_rtt, 3),
+            'rtt_avg': round(self.total_rtt / polls, 3),
+            'rtt_max': round(self.max_rtt, 3),
+            'batch_last': self.last_batch,
+            'batch_avg': round(self.updates / polls, 2),
+            'batch_max': self.max_batch,
+        }
+
+
+class UpdatePoller:
+    """Непрерывный long polling.
+
+    Следующий getUpdates отправляется сразу, как только предыдущая пачка
+    передана в submit. Пауза между запросами появляется только после ошибок
+    и растёт экспоненциально до backoff_max.
+
+    В getUpdates передается смещение принятых обновлений, поэтому медленное
+    обновление одного чата не задерживает получение остальных. На диск
+    сохраняется только смещение обработанных (UpdateDispatcher.committed_offset),
+    но Telegram к этому времени уже забыл принятые обновления: после падения
+    принятые и не обработанные обновления теряются. Их не больше, чем
+    max_pending диспетчера.
+    """
+
+    def __init__(
+        self,
+        client: LongPollBot,
+        submit: Callable[[RawUpdate], Awaitable],
+        offset: int = 0,
+        limit: int = 100,
+        timeout: int = 50,
+        backoff_min: float = 1.,
+        backoff_max: float = 30.,
+        log_every: int = 100,
+    ):
+        self.client = client
+        self.submit = submit
+        self.offset = offset
+        self.limit = limit
+        self.timeout = timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.log_every = log_every
+
+        self.stats = PollStats()
+
+    async def run(self):
+        backoff = self.backoff_min
+        _logger.info('started', offset=self.offset)
+
+        while True:
+            start = monotonic()
+            try:
+                updates = await self.client.get_updates(
+                    self.offset, timeout=self.timeout, limit=self.limit)
+            except asyncio.CancelledError:
+                _logger.info('stopped', offset=self.offset)
+                raise
+            except Exception as e:
+                self.stats.errors += 1
+                _logger.error('cannot get updates', error=e, backoff=backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+
+            backoff = self.backoff_min
+            self.stats.observe(monotonic() - start, len(updates))
+
+            for update in updates:
+                await self.submit(update)
+                self.offset = max(self.offset, update.update_id + 1)
+
+            if self.log_every and self.stats.polls % self.log_every == 0:
+                _logger.info('polling stats', **self.stats.as_dict())
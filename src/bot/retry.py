@@ -0,0 +1,78 @@
+import asyncio
+import random
+from time import monotonic
+
+import aiohttp
+
+from lib.bot.errors import RetryAfter, TelegramError
+
+
+def is_retriable(error: Exception) -> bool:
+    """Returns True if the same call can succeed later."""
+    if isinstance(error, TelegramError):
+        return error.retriable
+
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+
+    # Сеть, DNS, таймауты.
+    if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return True
+
+    return False
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 30.) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_delay(error: Exception, attempt: int, base: float = 0.5, cap: float = 30.) -> float:
+    if isinstance(error, RetryAfter):
+        return error.retry_after
+    return backoff(attempt, base, cap)
+
+
+class RetryBudget:
+    """Общий бюджет повторов.
+
+    Каждая новая попытка пополняет бюджет на ratio повтора, кроме того
+    бюджет пополняется на min_per_second в секунду. Повтор тратит единицу.
+    Когда бюджет исчерпан, повторы не выполняются: при падении апстрима
+    количество запросов не растёт лавинообразно.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1., max_tokens: float = 100.):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+
+        self._tokens = max_tokens
+        self._updated = monotonic()
+
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self, amount: float = 0.):
+        now = monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._tokens = min(self.max_tokens, self._tokens + amount)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def on_request(self):
+        self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            self.denied += 1
+            return False
+
+        self._tokens -= 1
+        self.spent += 1
+        return True
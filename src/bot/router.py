@@ -0,0 +1,137 @@
+import re
+from collections import defaultdict
+from typing import Callable, NamedTuple
+
+from lib.bot import models
+
+
+_command_head_re = re.compile(r'^\/[a-z_]+')
+
+# Строка, которая не должна совпадать ни с одним осмысленным аргументом.
+_probe_args = ' \x00probe'
+
+
+class Route(NamedTuple):
+    command: str
+    pattern: re.Pattern
+    handler: Callable
+    source: str
+
+
+def split_command(pattern: str) -> tuple[str | None, str]:
+    """Splits command pattern to the command token and the arguments pattern.
+
+    >>> split_command('/meme ?(.*)')
+    ('/meme', ' ?(.*)')
+
+    If the pattern doesn't start with a command, token is None.
+    """
+    match = _command_head_re.match(pattern)
+    if not match:
+        return None, pattern
+
+    _, end = match.span()
+    return pattern[:end], pattern[end:]
+
+
+def _utf16_slice(text: str, offset: int, length: int) -> tuple[str, int]:
+    """Returns entity text and its end position in python string.
+
+    Telegram counts entity offsets in UTF-16 code units.
+    """
+    if text.isascii() or all(ord(c) < 0x10000 for c in text):
+        return text[offset:offset + length], offset + length
+
+    encoded = text.encode('utf-16-le')
+    head = encoded[:offset * 2].decode('utf-16-le')
+    token = encoded[offset * 2:(offset + length) * 2].decode('utf-16-le')
+    return token, len(head) + len(token)
+
+
+class CommandRouter:
+    """Находит обработчик команды по токену из bot_command entity.
+
+    Паттерны регистрируются в виде '/command <args regex>'. Токен команды
+    служит ключом словаря, поэтому поиск кандидатов не зависит от количества
+    модулей. Регулярные выражения аргументов компилируются при регистрации
+    и проверяются только для кандидатов.
+    """
+
+    def __init__(self, bot_name: str = None):
+        self.bot_name = bot_name
+
+        self._routes: dict[str, list[Route]] = defaultdict(list)
+        # Паттерны без команды в начале проверяются как раньше: полным поиском.
+        self._fallback: list[Route] = []
+        self.conflicts: list[str] = []
+
+    def add(self, pattern: str, handler: Callable):
+        command, _ = split_command(pattern)
+
+        if command is None:
+            route = Route(None, re.compile(pattern, re.DOTALL), handler, pattern)
+            self._fallback.append(route)
+            return
+
+        route = Route(command, re.compile(pattern, re.DOTALL), handler, pattern)
+        self._check_conflicts(route)
+        self._routes[command].append(route)
+
+    def _check_conflicts(self, route: Route):
+        for other in self._routes.get(route.command, ()):
+            if other.source == route.source:
+                self.conflicts.append(
+                    f'{route.source!r} is registered multiple times')
+                continue
+
+            # Предыдущий паттерн принимает любые аргументы команды,
+            # значит новый никогда не будет вызван.
+            bare = other.pattern.match(route.command)
+            with_args = other.pattern.match(route.command + _probe_args)
+            if bare and with_args:
+                self.conflicts.append(
+                    f'{route.source!r} is shadowed by {other.source!r}')
+
+    def _commands(self, message: models.Message):
+        text = message.text or ''
+
+        for entity in message.entities or []:
+            if entity.type != models.EEntityType.bot_command:
+                continue
+
+            token, end = _utf16_slice(text, entity.offset, entity.length)
+            command, _, mention = token.partition('@')
+            if mention and self.bot_name and mention.lower() != self.bot_name.lower():
+                # Команда адресована другому боту.
+                continue
+
+            yield command, text[end:]
+
+    def handlers(self, command: str) -> list[Callable]:
+        """Returns handlers registered for the command token, e.g. '/meme'."""
+        return [route.handler for route in self._routes.get(command, ())]
+
+    def resolve(self, message: models.Message) -> tuple[Callable, re.Match] | tuple[None, None]:
+        """Returns the handler and the match for the message."""
+        for command, args in self._commands(message):
+            routes = self._routes.get(command)
+            if not routes:
+                continue
+
+            normalized = command + args
+            for route in routes:
+                match = route.pattern.match(normalized)
+                if match:
+                    return route.handler, match
+
+        text = message.text or ''
+        for route in self._fallback:
+            # Паттерн команды проверяется с учётом регистра.
+            match = route.pattern.search(text)
+            if match:
+                return route.handler, match
+
+        return None, None
+
+    def __len__(self) -> int:
+        return sum(map(len, self._routes.values())) + len(self._fallback)
@@ -0,0 +1,132 @@
+"""Метрики из stats() компонентов бота, собираются при чтении /metrics."""
+from typing import TYPE_CHECKING
+
+from lib import breaker, connectors
+from lib.logger import handlers as log_handlers
+from lib.metrics import Family
+from src.context import Context
+
+if TYPE_CHECKING:
+    from .bot import SuperBot
+
+
+_circuit_states = {
+    breaker.State.CLOSED.value: 0,
+    breaker.State.HALF_OPEN.value: 1,
+    breaker.State.OPEN.value: 2,
+}
+
+
+def _cache_families(caches: dict[str, dict]) -> list[Family]:
+    return [
+        Family('cache_entries', 'gauge', 'Entries in the cache.',
+               [({'cache': name}, stats['size']) for name, stats in caches.items()]),
+        Family('cache_hits_total', 'counter', 'Cache hits.',
+               [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        Family('cache_misses_total', 'counter', 'Cache misses.',
+               [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+    ]
+
+
+def _caches(bot: 'SuperBot') -> dict[str, dict]:
+    caches = {}
+    if bot.bot.file_cache is not None:
+        caches['file_id'] = bot.bot.file_cache.stats()
+
+    # Context заполняется в main.build, без него клиентов еще нет.
+    if Context not in Context._instances:
+        return caches
+
+    pinterest = Context().pinterest
+    pinterest_stats = pinterest.cache_stats()
+    caches['pinterest_search'] = pinterest_stats['search']
+    caches['pinterest_pins'] = pinterest_stats['pins']
+
+    if pinterest.response_cache is not None:
+        http = pinterest.response_cache.stats()
+        caches['http'] = {'size': http['entries'], 'hits': http['hits'], 'misses': http['misses']}
+    return caches
+
+
+def collect(bot: 'SuperBot') -> list[Family]:
+    families = []
+
+    if bot.dispatcher is not None:
+        families.append(Family('dispatcher_pending_updates', 'gauge',
+                               'Updates accepted but not processed yet.', [({}, bot.dispatcher.pending)]))
+
+    if bot.poller is not None:
+        stats = bot.poller.stats
+        families += [
+            Family('poller_polls_total', 'counter', 'getUpdates calls.', [({}, stats.polls)]),
+            Family('poller_errors_total', 'counter', 'Failed getUpdates calls.', [({}, stats.errors)]),
+            Family('poller_updates_total', 'counter', 'Updates received by polling.', [({}, stats.updates)]),
+            Family('offset_checkpoint_lag', 'gauge',
+                   'Update ids the persisted offset is behind.', [({}, bot.checkpoint.lag)]),
+        ]
+
+    if bot.ingest is not None:
+        stats = bot.ingest.stats()
+        families += [
+            Family('webhook_queue_depth', 'gauge', 'Webhook bodies waiting in the queue.', [({}, stats['depth'])]),
+            Family('webhook_queue_oldest_age_seconds', 'gauge',
+                   'Wait time of the oldest queued webhook body.', [({}, stats['oldest_age'])]),
+            Family('webhook_accepted_total', 'counter', 'Accepted webhook bodies.', [({}, stats['accepted'])]),
+            Family('webhook_dropped_total', 'counter', 'Shed or rejected webhook bodies.', [({}, stats['dropped'])]),
+        ]
+
+    if bot.bot.scheduler is not None:
+        stats = bot.bot.scheduler.stats()
+        families += [
+            Family('send_queue_depth', 'gauge', 'Messages waiting for the rate limiter.', [({}, stats['depth'])]),
+            Family('send_sent_total', 'counter', 'Messages sent through the scheduler.', [({}, stats['sent'])]),
+            Family('send_failed_total', 'counter', 'Messages that failed to send.', [({}, stats['failed'])]),
+            Family('send_throttled_total', 'counter', 'Telegram 429 responses.', [({}, stats['throttled'])]),
+        ]
+
+    families += [
+        Family('retry_budget_tokens', 'gauge', 'Retries left in the budget.', [({}, bot.retry_budget.tokens)]),
+        Family('retry_budget_denied_total', 'counter',
+               'Retries denied by the budget.', [({}, bot.retry_budget.denied)]),
+        Family('dead_letters_total', 'counter',
+               'Updates written to the dead letter log.', [({}, bot.dead_letters.written)]),
+    ]
+
+    families += _cache_families(_caches(bot))
+
+    pools = connectors.stats()
+    families += [
+        Family('http_requests_in_flight', 'gauge', 'Requests of the pool waiting for response headers.',
+               [({'profile': name}, stats['in_flight']) for name, stats in pools.items()]),
+        Family('http_connections_created_total', 'counter', 'New connections of the pool.',
+               [({'profile': name}, stats['created']) for name, stats in pools.items()]),
+        Family('http_connections_reused_total', 'counter', 'Reused connections of the pool.',
+               [({'profile': name}, stats['reused']) for name, stats in pools.items()]),
+        Family('http_connections_queued_total', 'counter', 'Requests that waited for a free connection.',
+               [({'profile': name}, stats['queued']) for name, stats in pools.items()]),
+    ]
+
+    circuits = breaker.stats()
+    families += [
+        Family('circuit_state', 'gauge', 'Circuit state: 0 closed, 1 half-open, 2 open.',
+               [({'host': host}, _circuit_states[stats['state']]) for host, stats in circuits.items()]),
+        Family('circuit_rejected_total', 'counter', 'Calls rejected by an open circuit.',
+               [({'host': host}, stats['rejected']) for host, stats in circuits.items()]),
+        Family('circuit_transitions_total', 'counter', 'Circuit state changes.',
+               [({'host': host}, stats['transitions']) for host, stats in circuits.items()]),
+    ]
+
+    if bot.loop_monitor is not None:
+        lag = bot.loop_monitor.percentiles()
+        families.append(Family('event_loop_lag_quantile_seconds', 'gauge',
+                               'Event loop lag percentiles over the recent window.',
+                               [({'quantile': q}, lag[key]) for q, key in
+                                (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99'))]))
+
+    logs = log_handlers.stats()
+    families += [
+        Family('log_queue_depth', 'gauge', 'Log records waiting for the writer thread.', [({}, logs['queued'])]),
+        Family('log_dropped_total', 'counter', 'Log records dropped on a full queue.', [({}, logs['dropped'])]),
+    ]
+
+    return families
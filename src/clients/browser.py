@@ -0,0 +1,149 @@
+import asyncio
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from pyppeteer import launch
+from pyppeteer.browser import Browser
+from pyppeteer.errors import PyppeteerError
+from pyppeteer.network_manager import Request
+from pyppeteer.page import Page
+
+from lib.logger import get_logger
+
+
+_logger = get_logger('clients.browser')
+
+BLOCKED_RESOURCES = frozenset(['image', 'media', 'font', 'stylesheet'])
+
+
+class BrowserPool:
+    """Долгоживущий headless браузер с пулом переиспользуемых вкладок.
+
+    Браузер запускается при первом запросе и делится между всеми
+    конкурентными поисками. Одновременно открыто не больше pages вкладок.
+    Запросы картинок, шрифтов и стилей отбрасываются. Упавший браузер
+    перезапускается при следующем запросе, простаивающий - закрывается
+    через close_idle().
+    """
+
+    def __init__(
+        self,
+        pages: int = 2,
+        idle_timeout: float = 300.,
+        viewport: dict = None,
+        blocked_resources: frozenset[str] = BLOCKED_RESOURCES,
+    ):
+        self.pages = pages
+        self.idle_timeout = idle_timeout
+        self.viewport = viewport or {'width': 1000, 'height': 1500}
+        self.blocked_resources = blocked_resources
+
+        self._browser: Browser = None
+        self._idle: list[Page] = []
+        self._in_use = 0
+        self._last_used = monotonic()
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(pages)
+
+        self.launches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._browser is not None
+
+    async def _get_browser(self) -> Browser:
+        async with self._lock:
+            if self._browser is None:
+                browser = await launch(
+                    headless=True,
+                    handleSIGINT=False,
+                    handleSIGTERM=False,
+                    handleSIGHUP=False,
+                )
+                browser.on(Browser.Events.Disconnected,
+                           lambda: self._on_disconnected(browser))
+                self._browser = browser
+                self.launches += 1
+                _logger.info('browser launched', launches=self.launches)
+            return self._browser
+
+    def _on_disconnected(self, browser: Browser):
+        if self._browser is browser:
+            _logger.warning('browser disconnected')
+            self._browser = None
+            self._idle = []
+
+    async def _intercept(self, request: Request):
+        try:
+            if request.resourceType in self.blocked_resources:
+                await request.abort()
+            else:
+                await request.continue_()
+        except PyppeteerError:
+            # Вкладка могла закрыться, пока запрос ждал решения.
+            pass
+
+    async def _new_page(self) -> Page:
+        browser = await self._get_browser()
+        page = await browser.newPage()
+        await page.setViewport(self.viewport)
+        await page.setRequestInterception(True)
+        page.on('request', lambda r: asyncio.ensure_future(self._intercept(r)))
+        return page
+
+    async def _take_page(self) -> Page:
+        while self._idle:
+            page = self._idle.pop()
+            if not page.isClosed():
+                return page
+        return await self._new_page()
+
+    @asynccontextmanager
+    async def page(self):
+        """Yields a page from the pool."""
+        async with self._slots:
+            self._in_use += 1
+            page = None
+            try:
+                page = await self._take_page()
+                yield page
+            except BaseException:
+                # Вкладку или весь браузер нельзя переиспользовать. Сюда же
+                # попадают таймауты и отмена: TimeoutError pyppeteer не
+                # наследует PyppeteerError. Вкладка закрывается и при отмене.
+                await asyncio.shield(self._discard(page))
+                raise
+            else:
+                if self._browser is not None and not page.isClosed():
+                    self._idle.append(page)
+            finally:
+                self._in_use -= 1
+                self._last_used = monotonic()
+
+    async def _discard(self, page: Page | None):
+        try:
+            if page is not None and not page.isClosed():
+                await page.close()
+        except PyppeteerError:
+            # Браузер не отвечает: перезапускаем его целиком.
+            await self.close()
+
+    async def close_idle(self):
+        """Closes the browser if it is not used for idle_timeout seconds."""
+        if not self.running or self._in_use:
+            return
+
+        if monotonic() - self._last_used >= self.idle_timeout:
+            _logger.info('closing idle browser')
+            await self.close()
+
+    async def close(self):
+        async with self._lock:
+            browser, self._browser = self._browser, None
+            self._idle = []
+
+            if browser is not None:
+                try:
+                    await browser.close()
+                except Exception as e:
+                    _logger.warning('cannot close browser', error=e)
@@ -1,63 +1,109 @@
-from random import choice, randint
+import asyncio
+import time
+from random import choice
+from yarl import URL
+from lib import breaker
+from lib.cache import TTLCache
 from lib.client import BaseClient, Params
+from lib.http_cache import ResponseCache
+from lib.scan import MarkerScanner
+
+from .browser import BrowserPool
 
-import asyncio
-from pyppeteer import launch
+
+# Случайный пин выбирается из первых результатов поиска.
+RANDOM_PINS_WINDOW = 50
 
 
 class PinterestShuffle(BaseClient):
     base_url: str = 'https://pinshuffle.herokuapp.com'
     
-    def __init__(self, url: str, cookie: str):
+    def __init__(self, url: str, cookie: str, response_cache: ResponseCache = None):
         base_url = f'{self.base_url}{url}'
         headers = {
             'Cookie': cookie
         }
-        super().__init__(base_url=base_url, headers=headers)
+        super().__init__(base_url=base_url, headers=headers, response_cache=response_cache)
     
-    async def get_random_pin(self) -> str:
-        resp = await self.get('')
-        
-        text = await resp.text()
-        
-        last_pos = 0
+    async def get_random_pin(self) -> str | None:
+        urls = await self.get_pins()
+        if not urls:
+            return None
+        return choice(urls)
+    
+    async def get_pins(self) -> list[str]:
+        """Returns all pin urls from a shuffled page."""
+        scanner = MarkerScanner(b'pin-url="', include_marker=False)
         urls = list()
         
-        pos_img = 0
-        while pos_img != -1:
-            pos_img = text.find('pin-url="', last_pos)
-            if pos_img == -1:
-                continue
-            
-            pos_img = pos_img + len('pin-url="')
-            end = text.find('"', pos_img)
-            last_pos = end
-            
-            u = text[pos_img:end]
-            urls.append(u)
-            
-        return choice(urls)
+        async with self.stream('get', '') as resp:
+            async for chunk in self.iter_chunks(resp):
+                urls.extend(u.decode() for u in scanner.feed(chunk))
+        
+        return urls
 
 
 class Pinterest(BaseClient):
     base_url: str = ''
+    coalesce_requests: bool = True
+    
+    def __init__(
+        self,
+        browser_pages: int = 2,
+        browser_idle_timeout: float = 300.,
+        search_cache_size: int = 256,
+        search_cache_ttl: float = 600.,
+        pin_cache_size: int = 4096,
+        pin_cache_ttl: float = 86400.,
+        response_cache: ResponseCache = None,
+    ):
+        super().__init__(response_cache=response_cache)
+        
+        self.browser = BrowserPool(pages=browser_pages, idle_timeout=browser_idle_timeout)
+        
+        # Запрос -> все найденные пины, пин -> ссылка на оригинал картинки.
+        self._search_cache = TTLCache(search_cache_size, search_cache_ttl)
+        self._pin_cache = TTLCache(pin_cache_size, pin_cache_ttl)
+    
+    async def close(self):
+        await self.browser.close()
+        await super().close()
     
-    def __init__(self):
-        super().__init__()
+    def cache_stats(self) -> dict:
+        return {
+            'search': self._search_cache.stats(),
+            'pins': self._pin_cache.stats(),
+            'coalesced': self.coalesced,
+            'http': self.response_cache.stats() if self.response_cache is not None else None,
+        }
+    
+    async def get_pin_image_url(self, url: str) -> str | None:
+        img = self._pin_cache.get(url)
+        if img:
+            return img
         
+        return await self._flight.do(('pin', url), lambda: self._fetch_pin_image_url(url))
     
-    async def get_pin_image_url(self, url: str) -> str:
-        resp = await self.get(url)
+    async def _fetch_pin_image_url(self, url: str) -> str | None:
+        scanner = MarkerScanner(b'https://i.pinimg.com/originals/')
+        img = None
+        
+        async with self.stream('get', url) as resp:
+            async for chunk in self.iter_chunks(resp):
+                found = scanner.feed(chunk)
+                if found:
+                    # Остаток страницы не нужен: соединение закрывается.
+                    img = found[0].decode()
+                    break
         
-        text = await resp.text()
+        if not img:
+            return None
         
-        look_for = 'https://i.pinimg.com/originals/'
-        img_start = text.find(look_for)
-        end = text.find('"', img_start)
-        img = text[img_start:end]
+        self._pin_cache.set(url, img)
         return img
     
-    async def get_search_url(self, search: str, rand=False) -> str:
+    async def search_pins(self, search: str) -> list[str]:
+        """Returns paths of all pins found by the search query."""
         found = False
         for s in 'mem meme мем'.split():
             if s in search:
@@ -66,38 +112,75 @@ class Pinterest(BaseClient):
         
         if not found:
             search = f'мем {search}'
-
-        url = f'https://ru.pinterest.com/search/pins/?q={search.replace(" ", "%20")}&ts=typed'
         
-        browser = await launch(headless=True)
-        page = await browser.newPage()
-        await page.setViewport({
-            'width': 1000,
-            'height': 1500
-        })
-        await page.goto(url, options={'waitUntil': 'networkidle2'})
+        key = ' '.join(search.lower().split())
+        pins = self._search_cache.get(key)
+        if pins is not None:
+            return pins
+        
+        # Одинаковые поиски, пришедшие одновременно, рендерят страницу один раз.
+        return await self._flight.do(('search', key), lambda: self._search_pins(key, search))
+    
+    async def _search_pins(self, key: str, search: str) -> list[str]:
+        url = f'https://ru.pinterest.com/search/pins/?q={search.replace(" ", "%20")}&ts=typed'
         
-        text = await page.content()
-        await browser.close()
+        text = await self._render(url)
         
         look_for = 'href="/pin/'
-        if rand:
-            skip = randint(1, 50)
-        else:
-            skip = 1
-
-        last_end = 0
+        pins = []
+        seen = set()
         
-        last_url = ''
-        for _ in range(skip):
-            pos = text.find(look_for, last_end)
-            if pos == -1:
-                break
-
+        pos = text.find(look_for)
+        while pos != -1:
             pos += len('href="')
             end = text.find('"', pos)
             
-            last_end = end
-            last_url = text[pos:end]
+            pin = text[pos:end]
+            if pin not in seen:
+                seen.add(pin)
+                pins.append(pin)
+            
+            pos = text.find(look_for, end)
+        
+        if pins:
+            self._search_cache.set(key, pins)
+        return pins
+    
+    async def _render(self, url: str) -> str:
+        """Returns the page content rendered by the browser."""
+        # Поиск идет не через BaseClient, поэтому у браузера свой breaker:
+        # его ошибки и таймауты не смешиваются с HTTP запросами к тому же хосту.
+        circuit = breaker.get_breaker(f'browser:{URL(url).host}') if self.circuit_breaker else None
+        if circuit is None:
+            return await self._render_page(url)
+        
+        ticket = circuit.before_call()
+        started = time.monotonic()
+        try:
+            text = await self._render_page(url)
+        except asyncio.CancelledError:
+            circuit.on_cancel(ticket)
+            raise
+        except Exception:
+            circuit.on_failure(ticket)
+            raise
+        
+        circuit.on_success(time.monotonic() - started, ticket)
+        return text
+    
+    async def _render_page(self, url: str) -> str:
+        async with self.browser.page() as page:
+            await page.goto(url, options={'waitUntil': 'networkidle2'})
+            return await page.content()
+    
+    async def get_search_url(self, search: str, rand=False) -> str | None:
+        pins = await self.search_pins(search)
+        if not pins:
+            return None
+        
+        if rand:
+            pin = choice(pins[:RANDOM_PINS_WINDOW])
+        else:
+            pin = pins[0]
         
-        return await self.get_pin_image_url(f'https://ru.pinterest.com{last_url}')
+        return await self.get_pin_image_url(f'https://ru.pinterest.com{pin}')
@@ -1,5 +1,9 @@
+import asyncio
+from datetime import timedelta
+from lib.breaker import CircuitOpenError
+from lib.prefetch import PrefetchBuffer
 from src.clients import anime
-from src.modules.base import BaseModule, Command, Match
+from src.modules.base import BaseModule, Command, Coro, Match
 from src.context import Context
 from src.bot.chat import Chat
 
@@ -7,10 +11,30 @@ from src.bot.chat import Chat
 
 
 class Anime(BaseModule):
+    CONFIG_SCHEME = {
+        'buffer': {
+            'type': 'dict',
+            'default': {},
+            'schema': {
+                'size': {'type': 'integer', 'default': 20, 'min': 1},
+                'low': {'type': 'integer', 'default': 10, 'min': 0},
+                'history': {'type': 'integer', 'default': 200, 'min': 0},
+                'concurrency': {'type': 'integer', 'default': 4, 'min': 1},
+            }
+        },
+        # Интервал пополнения: coroutines.refill.delay
+        'coroutines': {'type': 'dict'},
+    }
+
     def __init__(self, config: dict, loop=None) -> None:
         super().__init__(config, loop)
         
         self.client = Context().anime
+
+        buffer = self.config['buffer']
+        self.concurrency = buffer['concurrency']
+        # Ссылки на картинки, полученные заранее.
+        self.images = PrefetchBuffer(low=buffer['low'], high=buffer['size'], history=buffer['history'])
     
     @property
     def commands(self) -> list[Command]:
@@ -18,10 +42,41 @@ class Anime(BaseModule):
             Command('/anime', self.anime),
         )
     
+    def coroutines(self) -> list[Coro]:
+        return (
+            Coro(timedelta(seconds=2), self.refill),
+        )
+
+    async def refill(self, ctx=None):
+        if not self.images.needs_refill:
+            return
+
+        while self.images.missing:
+            count = min(self.images.missing, self.concurrency)
+            urls = await asyncio.gather(
+                *[self.client.get_rand_girl() for _ in range(count)],
+                return_exceptions=True,
+            )
+
+            errors = [u for u in urls if isinstance(u, Exception)]
+            added = sum(self.images.put(u) for u in urls if isinstance(u, str))
+            if errors:
+                self.logger.with_fields(ctx).warning('cannot refill buffer', error=errors[0], size=len(self.images))
+                return
+            if not added:
+                return
+
     async def anime(self, chat: Chat, match: Match, ctx=None):
         logger = self.logger.with_fields(ctx)
         
-        url = await self.client.get_rand_girl()
+        url = self.images.take()
+        if not url:
+            try:
+                url = await self.client.get_rand_girl()
+            except CircuitOpenError as e:
+                logger.warning('upstream unavailable', error=e)
+                await chat.reply('pic.re сейчас недоступен, попробуй позже 🙈')
+                return
         await chat.send_photo_by_url(url)
         
         return
@@ -1,16 +1,42 @@
-from src.modules.base import BaseModule, Command
-from src.modules.base import BaseModule, Command, Match
+import asyncio
+from datetime import timedelta
+from lib.breaker import CircuitOpenError
+from lib.prefetch import PrefetchBuffer
+from src.modules.base import BaseModule, Command, Coro, Match
 from src.bot.chat import Chat
 from src.context import Context
 
 
+UPSTREAM_UNAVAILABLE = 'Pinterest сейчас недоступен, попробуй позже 🙈'
+
+
 class Meme(BaseModule):
+    CONFIG_SCHEME = {
+        'pool': {
+            'type': 'dict',
+            'default': {},
+            'schema': {
+                'low': {'type': 'integer', 'default': 5, 'min': 0},
+                'high': {'type': 'integer', 'default': 20, 'min': 1},
+                'history': {'type': 'integer', 'default': 200, 'min': 0},
+                'resolve_concurrency': {'type': 'integer', 'default': 4, 'min': 1},
+                'max_pages': {'type': 'integer', 'default': 3, 'min': 1},
+            }
+        },
+        'coroutines': {'type': 'dict'},
+    }
+    
     def __init__(self, config: dict, loop=None) -> None:
         super().__init__(config, loop)
         
         self.shuffle = Context().pinterest_shuffle
         self.pinterest = Context().pinterest
         
+        pool = self.config['pool']
+        # Картинки случайных пинов для /meme без аргументов.
+        self.pins = PrefetchBuffer(low=pool['low'], high=pool['high'], history=pool['history'])
+        self._resolve_slots = asyncio.Semaphore(pool['resolve_concurrency'])
+        
     @property
     def commands(self) -> list[Command]:
         return (
@@ -18,15 +44,62 @@ class Meme(BaseModule):
             Command('/randmeme (.*)', self.randmeme),
         )
     
+    def coroutines(self) -> list[Coro]:
+        return (
+            Coro(timedelta(seconds=60), self.close_idle_browser),
+            Coro(timedelta(seconds=5), self.refill_pins),
+        )
+    
+    async def refill_pins(self, ctx=None):
+        if not self.pins.needs_refill:
+            return
+        
+        for _ in range(self.config['pool']['max_pages']):
+            try:
+                pins = await self.shuffle.get_pins()
+            except CircuitOpenError:
+                # Апстрим недоступен, пул пополнится, когда он вернётся.
+                return
+            
+            images = await asyncio.gather(
+                *[self._resolve_pin(pin) for pin in pins[:self.pins.missing]],
+                return_exceptions=True,
+            )
+            
+            for image_url in images:
+                if isinstance(image_url, str):
+                    self.pins.put(image_url)
+            
+            if not self.pins.missing:
+                break
+    
+    async def _resolve_pin(self, pin_url: str) -> str | None:
+        async with self._resolve_slots:
+            return await self.pinterest.get_pin_image_url(pin_url)
+    
+    async def close_idle_browser(self, ctx=None):
+        await self.pinterest.browser.close_idle()
+    
+    async def close(self):
+        await self.pinterest.browser.close()
+    
     async def meme(self, chat: Chat, match: Match, ctx=None):
         logger = self.logger.with_fields(ctx)
         
         req = match.group(1) if match else None
-        if not req:
-            pin_url = await self.shuffle.get_random_pin()
-            image_url = await self.pinterest.get_pin_image_url(pin_url)
-        else:
-            image_url = await self.pinterest.get_search_url(req.strip(), rand=False)
+        try:
+            if not req:
+                image_url = self.pins.take()
+                if not image_url:
+                    # Пул пуст: получаем пин как раньше, синхронно.
+                    pin_url = await self.shuffle.get_random_pin()
+                    image_url = pin_url and await self.pinterest.get_pin_image_url(pin_url)
+            else:
+                image_url = await self.pinterest.get_search_url(req.strip(), rand=False)
+        except CircuitOpenError as e:
+            logger.warning('upstream unavailable', error=e)
+            await chat.reply(UPSTREAM_UNAVAILABLE)
+            return
 
         if not image_url:
             await chat.reply('Не нашел мемов 🙈')
@@ -41,7 +114,12 @@ class Meme(BaseModule):
         if not req:
             return
         
-        image_url = await self.pinterest.get_search_url(req.strip(), rand=True)
+        try:
+            image_url = await self.pinterest.get_search_url(req.strip(), rand=True)
+        except CircuitOpenError as e:
+            logger.warning('upstream unavailable', error=e)
+            await chat.reply(UPSTREAM_UNAVAILABLE)
+            return
 
         if not image_url:
             await chat.reply('Не нашел мемов 🙈')
@@ -4,10 +4,14 @@ import functools
 from operator import ge
 from time import monotonic
 
+from lib import metrics
 from lib.logger.structlog import get_logger
 
 _logger = get_logger('utils')
 
+_cycle_duration = metrics.histogram('periodic_cycle_duration_seconds', 'Periodic coroutine cycle time.', ('coro',))
+_cycle_failures = metrics.counter('periodic_failures_total', 'Failed periodic coroutine cycles.', ('coro',))
+
 
 def create_counter(start=0):
     def counter():
@@ -35,6 +39,8 @@ def make_periodic(delay, coro, logger=None):
         delay = delay.total_seconds()
 
     logger = logger or _logger.with_fields(coro=coro.__name__)
+    duration = _cycle_duration.labels(coro.__name__)
+    failures = _cycle_failures.labels(coro.__name__)
 
     @functools.wraps(coro)
     async def periodic():
@@ -43,15 +49,18 @@ def make_periodic(delay, coro, logger=None):
 
         logger.info('started')
         while True:
+            start = monotonic()
             try:
                 logger.set_fields(coro_cycle=cycle(), func=coro.__name__)
                 logger.debug('started cycle')
-                start = monotonic()
                 await coro(ctx=logger.context())
+                duration.observe(monotonic() - start)
                 logger.debug('finished cycle', time=monotonic() - start)
             except asyncio.CancelledError:
                 delay = 0  # stop
             except Exception as e:
+                failures.inc()
+                duration.observe(monotonic() - start)
                 logger.exception('failed', error=e)
 
             if not delay:
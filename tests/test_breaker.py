@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from lib.breaker import BreakerSettings, CircuitBreaker, CircuitOpenError, State
+
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker('upstream', BreakerSettings(window=4, min_calls=2, open_seconds=0.01, half_open_calls=1))
+    for _ in range(2):
+        breaker.on_failure(breaker.before_call())
+    assert breaker.state == State.OPEN
+    return breaker
+
+
+def test_open_circuit_rejects_calls():
+    breaker = _open_breaker()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_trial_success_closes_circuit():
+    breaker = _open_breaker()
+    time.sleep(0.02)
+
+    ticket = breaker.before_call()
+    assert breaker.state == State.HALF_OPEN
+    breaker.on_success(0.1, ticket)
+    assert breaker.state == State.CLOSED
+
+
+def test_call_admitted_before_opening_is_not_a_trial():
+    breaker = CircuitBreaker('upstream', BreakerSettings(window=4, min_calls=2, open_seconds=0.01, half_open_calls=1))
+    early = breaker.before_call()
+    for _ in range(2):
+        breaker.on_failure(breaker.before_call())
+    time.sleep(0.02)
+
+    ticket = breaker.before_call()
+    breaker.on_success(0.1, early)
+    assert breaker.state == State.HALF_OPEN
+
+    breaker.on_failure(early)
+    assert breaker.state == State.HALF_OPEN
+
+    breaker.on_success(0.1, ticket)
+    assert breaker.state == State.CLOSED
@@ -0,0 +1,168 @@
+import asyncio
+
+from lib.bot.decoding import RawUpdate
+from src.bot.dispatcher import UpdateDispatcher
+
+
+def _update(update_id: int, chat_id: int) -> RawUpdate:
+    return RawUpdate({
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': 'hi'},
+    })
+
+
+class _Gates:
+    """Обработчик, который завершает обновление по команде теста."""
+
+    def __init__(self):
+        self.events: dict[int, asyncio.Event] = {}
+        self.processed: list[int] = []
+
+    def release(self, update_id: int):
+        self.events.setdefault(update_id, asyncio.Event()).set()
+
+    async def process(self, update: RawUpdate):
+        await self.events.setdefault(update.update_id, asyncio.Event()).wait()
+        self.processed.append(update.update_id)
+
+
+async def _settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_committed_offset_waits_for_lowest_pending():
+    async def run():
+        gates = _Gates()
+        commits = []
+        dispatcher = UpdateDispatcher(gates.process, workers=4, on_commit=commits.append)
+        dispatcher.next_offset = 10
+        dispatcher.start()
+
+        assert dispatcher.committed_offset == 10
+        for update_id, chat_id in ((10, 1), (11, 2), (12, 3)):
+            await dispatcher.submit(_update(update_id, chat_id))
+        assert dispatcher.committed_offset == 10
+        assert dispatcher.pending == 3
+
+        # Завершение обновлений после наименьшего не сдвигает смещение.
+        gates.release(12)
+        gates.release(11)
+        await _settle()
+        assert dispatcher.committed_offset == 10
+        assert commits == []
+
+        gates.release(10)
+        await _settle()
+        assert dispatcher.committed_offset == 13
+        assert commits == [13]
+
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+
+def test_duplicates_are_dropped():
+    async def run():
+        gates = _Gates()
+        dispatcher = UpdateDispatcher(gates.process, workers=2)
+        dispatcher.start()
+
+        await dispatcher.submit(_update(5, 1))
+        await dispatcher.submit(_update(5, 1))
+        await dispatcher.submit(_update(4, 2))
+        assert dispatcher.pending == 1
+        assert dispatcher.committed_offset == 5
+
+        gates.release(5)
+        await dispatcher.join()
+        assert gates.processed == [5]
+        assert dispatcher.committed_offset == 6
+
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+
+def test_chat_order_is_kept():
+    async def run():
+        gates = _Gates()
+        dispatcher = UpdateDispatcher(gates.process, workers=4)
+        dispatcher.start()
+
+        for update_id in (1, 2, 3):
+            await dispatcher.submit(_update(update_id, 7))
+        for update_id in (3, 2, 1):
+            gates.release(update_id)
+        await dispatcher.join()
+
+        assert gates.processed == [1, 2, 3]
+        assert dispatcher.committed_offset == 4
+
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+
+def test_replay_does_not_move_committed_offset():
+    async def run():
+        gates = _Gates()
+        commits = []
+        dispatcher = UpdateDispatcher(gates.process, workers=2, on_commit=commits.append)
+        dispatcher.next_offset = 20
+        dispatcher.start()
+
+        await dispatcher.submit(_update(3, 1), replay=True)
+        assert dispatcher.pending == 1
+        assert dispatcher.committed_offset == 20
+
+        await dispatcher.submit(_update(20, 2))
+        assert dispatcher.committed_offset == 20
+
+        gates.release(3)
+        gates.release(20)
+        await dispatcher.join()
+        assert sorted(gates.processed) == [3, 20]
+        assert dispatcher.committed_offset == 21
+        assert commits == [21]
+
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+
+def test_repeated_id_without_dedupe_is_counted_twice():
+    async def run():
+        gates = _Gates()
+        dispatcher = UpdateDispatcher(gates.process, workers=2, dedupe=False)
+        dispatcher.start()
+
+        await dispatcher.submit(_update(1, 1))
+        await dispatcher.submit(_update(1, 1))
+        assert dispatcher.pending == 2
+
+        gates.release(1)
+        await dispatcher.join()
+        assert gates.processed == [1, 1]
+        assert dispatcher.pending == 0
+
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+
+def test_submit_reports_dropped_duplicates():
+    async def run():
+        gates = _Gates()
+        dispatcher = UpdateDispatcher(gates.process, workers=1)
+        dispatcher.start()
+
+        assert await dispatcher.submit(_update(1, 1))
+        assert not await dispatcher.submit(_update(1, 1))
+        assert await dispatcher.submit(_update(1, 1), replay=True)
+
+        gates.release(1)
+        await dispatcher.join()
+        await dispatcher.close()
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from lib.http_cache import CacheEntry, ResponseCache
+
+
+def _entry(body: bytes) -> CacheEntry:
+    return CacheEntry(url='http://upstream/', status=200, headers=(), body=body,
+                      expires=time.time() + 60, etag=None, last_modified=None)
+
+
+def test_disk_hit_keeps_entries_it_evicts(tmp_path):
+    async def run():
+        cache = ResponseCache(max_bytes=10, directory=str(tmp_path))
+        await cache.set('a', _entry(b'a' * 8))
+        # 'a' вытесняется на диск.
+        await cache.set('b', _entry(b'b' * 8))
+        assert cache.stats()['disk_entries'] == 1
+
+        # Чтение 'a' с диска вытесняет 'b': она тоже должна остаться на диске.
+        assert (await cache.get('a')).body == b'a' * 8
+        assert cache.stats()['disk_entries'] == 2
+        assert (await cache.get('b')).body == b'b' * 8
+
+    asyncio.run(run())
+
+
+def test_unreadable_disk_entry_is_a_miss(tmp_path):
+    async def run():
+        cache = ResponseCache(max_bytes=10, directory=str(tmp_path))
+        await cache.set('a', _entry(b'a' * 8))
+        await cache.set('b', _entry(b'b' * 8))
+
+        filename = cache._filename('a')
+        with open(filename, 'wb') as file:
+            file.write(b'not json\nbody')
+
+        assert await cache.get('a') is None
+        assert cache.stats()['disk_entries'] == 0
+        assert not (tmp_path / filename).exists()
+
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+from lib.prefetch import PrefetchBuffer
+
+
+def test_history_zero_allows_repeats():
+    buffer = PrefetchBuffer(low=1, high=5, history=0)
+
+    assert buffer.put('a')
+    assert buffer.take() == 'a'
+    # Без истории выданное значение сразу можно добавить снова.
+    assert buffer.put('a')
+    assert buffer.take() == 'a'
+    assert buffer.take() is None
+
+
+def test_history_one_rejects_last_value():
+    buffer = PrefetchBuffer(low=1, high=5, history=1)
+
+    assert buffer.put('a')
+    assert buffer.take() == 'a'
+    assert not buffer.put('a')
+
+    assert buffer.put('b')
+    assert buffer.take() == 'b'
+    # 'a' вытеснено из истории значением 'b'.
+    assert buffer.put('a')
+    assert not buffer.put('b')